@@ -4,33 +4,49 @@
 
 import threading
 import datetime
+from concurrent.futures import ThreadPoolExecutor
+import time
 import subprocess
 import pathlib
-from typing import OrderedDict, Any
+from typing import OrderedDict, Any, Callable, Iterable
 import os
 from dataclasses import dataclass
+from functools import partial, lru_cache
 import uuid
 from urllib.parse import urlparse
 import logging
+import mimetypes
 import flask
-from flask import Flask, render_template, jsonify, make_response, request, Response
+from flask import Flask, render_template, jsonify, request, Response
 from flask_login import LoginManager, login_user, login_required
 from flask_bootstrap import Bootstrap
-from src import users, storage
+from werkzeug.security import safe_join
+from src import users, storage, httpclient
 from apscheduler.schedulers.background import BackgroundScheduler
 import icalendar
 import requests.auth
+import filelock
 import sentry_sdk
 import bs4
 
 import zpfwebsite
-from src.productionplanner import remove_friends_night_tag
+from src.productionplanner import (
+    ParsedActs,
+    TimelineEvent,
+    diff_acts,
+    remove_friends_night_tag,
+)
 from src.util import is_safe_url
+from src.views import MaterializedView, PrebuiltJson
+from src.events import EventBroadcaster
+from src.eventserver import EventStreamServer
+from src.compression import COMPRESSORS, CompressionCache, choose_encoding, is_compressible
 
 APP_DIR = pathlib.Path(__file__).parent
 DEFAULT_INSTANCE_PATH = APP_DIR / "instance"
 
 scheduler = BackgroundScheduler()
+DESCRIPTIONS_JOB_ID = "update_act_descriptions"
 
 # from datetime int to dutch
 LEGACY_DAYS = {
@@ -43,6 +59,11 @@ LEGACY_DAYS = {
     6: "zondag",
 }
 
+LEGACY_WEEKDAYS = {name: weekday for weekday, name in LEGACY_DAYS.items()}
+
+# stages for which the legacy programme is materialized, others are built on request
+LEGACY_STAGES = ["AMIGO"]
+
 
 def get_resource(url, session):
     contents = session.get(url).content
@@ -96,9 +117,31 @@ def create_app(
     login_manager.init_app(app)
     Bootstrap(app)
 
-    api = zpfwebsite.Api(app.config["ZPF_API_URL"] if app.config["UPDATE_PROGRAMME"] else "")
+    # several processes serve the same instance folder, see `start_ingest`
+    multi_process = app.config["MULTI_PROCESS"]
+
+    # reading it may even start a subprocess, so only once
+    version = get_version()
+
+    # shared by all upstream fetches, to reuse connections
+    http_session = httpclient.create_session(
+        connect_timeout=app.config["HTTP_CONNECT_TIMEOUT"],
+        read_timeout=app.config["HTTP_READ_TIMEOUT"],
+        retries=app.config["HTTP_RETRIES"],
+        breaker=httpclient.CircuitBreaker(
+            app.config["HTTP_CIRCUIT_FAILURES"], app.config["HTTP_CIRCUIT_COOLDOWN_SECONDS"]
+        ),
+    )
+    api = zpfwebsite.Api(
+        app.config["ZPF_API_URL"],
+        session=http_session,
+        cache_dir=app.instance_path,
+        max_age=app.config["WEBSITE_CACHE_SECONDS"],
+    )
 
-    programme_schema_major = 2
+    # 3: added plain text "description" next to "description_html"
+    # (the optional "matches" don't need a new version, see `update_act_descriptions`)
+    programme_schema_major = 3
 
     def programme_validator(programme: dict[str, Any]) -> bool:
         try:
@@ -109,90 +152,207 @@ def create_app(
             return False
         return True
 
-    programme_storage = storage.CachedStorage[dict[str, Any], str](
+    def make_storage(
+        name: str, default, key_field: str | None = None, **kwargs
+    ) -> storage.CachedStorage:
+        """Creates the storage for `<name>.json` in the instance folder
+
+        Which backend is used is configured by `STORAGE_BACKENDS`. `key_field` identifies the
+        items of a list, for backends which store items individually.
+        """
+        backend = app.config["STORAGE_BACKENDS"].get(name, "json")
+        file = f"{name}.json"
+        if multi_process:
+            if backend != "json":
+                raise ValueError(f"storage backend '{backend}' doesn't support MULTI_PROCESS")
+            return storage.SharedStorage(default, os.path.join(app.instance_path, file), **kwargs)
+        if backend == "json":
+            return storage.CachedStorage(default, file, app.open_instance_resource, **kwargs)
+        if backend == "journal":
+            return storage.JournaledStorage(
+                default,
+                file,
+                app.open_instance_resource,
+                compact_threshold=app.config["JOURNAL_COMPACT_BYTES"],
+                **kwargs,
+            )
+        if backend == "sqlite":
+            return storage.SqliteStorage(
+                default,
+                os.path.join(app.instance_path, app.config["SQLITE_DATABASE"]),
+                name,
+                key_field=key_field,
+                migrate_from=os.path.join(app.instance_path, file),
+                **kwargs,
+            )
+        raise ValueError(f"unknown storage backend '{backend}' for {name}")
+
+    programme_storage: storage.CachedStorage[dict[str, Any], str] = make_storage(
+        "programme_cache",
         {"schema_version": f"{programme_schema_major}.0", "acts": {}},
-        "programme_cache.json",
-        app.open_instance_resource,
         validator=programme_validator,
     )
-    acts_storage = storage.CachedStorage[list[dict[str, Any]], str](
-        [], "acts.json", app.open_instance_resource
-    )
-    itinerary_storage = storage.CachedStorage[dict[str, dict], str](
-        {}, "itinerary.json", app.open_instance_resource
+    acts_storage: storage.CachedStorage[list[dict[str, Any]], str] = make_storage(
+        "acts", [], key_field="id"
     )
+    itinerary_storage: storage.CachedStorage[dict[str, dict], str] = make_storage("itinerary", {})
 
-    def initialize_nonexistent_act_itineraries(acts: list[dict]):
-        with itinerary_storage.lock() as itinerary:
-            for act in acts:
-                key = str(act["id"])
-                if key not in itinerary:
-                    itinerary[key] = {"dressing_room": "None"}
-            itinerary_storage.save()
+    # the acts as parsed from acts_storage, which is what should be used for reading them
+    parsed_acts = ParsedActs()
+
+    # notifies clients about changes, see `serve_events`
+    events = EventBroadcaster()
+
+    def add_nonexistent_act_itineraries(itinerary: dict[str, dict], acts: list[dict]) -> set[str]:
+        """Returns the keys of the acts whose itinerary was added"""
+        added = set()
+        for act in acts:
+            key = str(act["id"])
+            if key not in itinerary:
+                itinerary[key] = {"dressing_room": "None"}
+                added.add(key)
+        return added
+
+    def initialize_nonexistent_act_itineraries():
+        transaction = storage.Transaction(itinerary_storage, acts_storage)
+        with transaction as (itinerary, acts):
+            added = add_nonexistent_act_itineraries(itinerary, acts)
+        if acts_storage in transaction.changed:
+            # only written in the storage's own format, but that's a new generation (and digest)
+            rebuild_legacy_programmes()
+        if transaction.changed:
+            events.publish(
+                "itinerary",
+                act=None,
+                acts=sorted(added),
+                generation=itinerary_storage.generation,
+            )
 
     def update_acts():
         config = app.config
-        session = requests.Session()
-        session.auth = requests.auth.HTTPBasicAuth(config["ACTS_USERNAME"], config["ACTS_PASSWORD"])
+        auth = requests.auth.HTTPBasicAuth(config["ACTS_USERNAME"], config["ACTS_PASSWORD"])
         logger.info("getting acts...")
-        response = session.get(config["ACTS_URL"])
+        response = http_session.get(config["ACTS_URL"], auth=auth)
         response.raise_for_status()
         acts_temp = response.json()
         if not isinstance(acts_temp, list):
             logger.error(f"acts in unexpected format: {acts_temp}")
             return
 
-        with acts_storage.lock() as acts:
-            acts.clear()
-            acts.extend(acts_temp)
-            acts_storage.save()
-
-        initialize_nonexistent_act_itineraries(acts_temp)
+        # the usual case, which shouldn't cost any locking or writing
+        if not diff_acts(acts_storage.snapshot().data, acts_temp):
+            logger.info("acts not changed")
+            return
 
-    def _html_description_to_text(html_description: str) -> str:
-        # ensure we keep separation between paragraphs
-        html_description = html_description.replace("<p>", "\n\n")
-        # remove remaining tags
-        # use html.parser to not be dependant on lxml, which is harder to install for some targets,
-        # as it contains C code
-        return bs4.BeautifulSoup(html_description, "html.parser").get_text().strip()
+        transaction = storage.Transaction(acts_storage, itinerary_storage)
+        with transaction as (acts, itinerary):
+            diff = diff_acts(acts, acts_temp)
+            acts[:] = acts_temp
+            added_itineraries = add_nonexistent_act_itineraries(itinerary, acts)
+        if not diff:
+            return
+        logger.info(f"acts changed: {diff.summary()}")
+        snapshot = acts_storage.snapshot()
+        parsed_acts.get(snapshot.data, snapshot.generation)
+
+        stages = None if diff.reordered else show_stages(diff.acts()) & set(LEGACY_STAGES)
+        rebuild_legacy_programmes(stages)
+        events.publish(
+            "programme",
+            generation=acts_storage.generation,
+            stages=sorted(stages) if stages is not None else None,
+            acts=sorted(diff.keys()),
+            **diff.summary(),
+        )
+        # the itinerary also contains times from the acts' timelines
+        itinerary_changed = added_itineraries | diff.removed.keys() | diff.rescheduled
+        if itinerary_changed:
+            events.publish(
+                "itinerary",
+                act=None,
+                acts=sorted(itinerary_changed),
+                generation=itinerary_storage.generation,
+            )
+
+    # generation of the acts which were last matched to the website's programs
+    described_acts_generation: int | None = None
 
     def update_act_descriptions():
+        """Updates the descriptions of the Amigo acts from the website
+
+        Acts are matched to a website program once, after which the match is kept in the
+        programme's "matches", by act key. They're only matched again when their name changes or
+        the program is gone. Matches can also be pinned by operators, see `pin_match`.
+        """
+        nonlocal described_acts_generation
+        acts = acts_storage.snapshot()
         try:
-            website_acts = api.get_programs("Amigo")
+            website_acts = api.get_programs("Amigo", only_if_changed=True)
+            if website_acts is None:
+                if acts.generation == described_acts_generation:
+                    logger.info("website and acts not changed, descriptions are up to date")
+                    return
+                website_acts = api.get_programs("Amigo")
+            # pinned programs may be elsewhere
+            programs_by_id = {
+                program["id"]: program for program in api.get_programs() if "id" in program
+            }
         except Exception as e:
             logger.error(f"could not get acts from website: {e}")
             sentry_sdk.capture_exception(e)
             website_acts = None
 
-        with acts_storage.lock() as acts:
-            acts_copy = acts.copy()
-
+        matches = programme_storage.snapshot().data.get("matches", {})
         descriptions: dict[str, str | None] = {}
-        for act in acts_copy:
-            key = str(act["id"])
+        names: dict[str, str] = {}
+        for act in parsed_acts.get(acts.data, acts.generation):
+            key = act.key
             if key not in descriptions:
                 descriptions[key] = None
-            if not any(event["stage"] == "Amigo" for event in act["timeline"]):
+            if "Amigo" not in act.stages:
                 continue
             if website_acts is None:
                 continue
 
-            name = remove_friends_night_tag(act["name"])
-            try:
-                best = zpfwebsite.find_best_matching_program(website_acts, name)
-            except ValueError:
-                try:
-                    best = zpfwebsite.find_best_matching_program(
-                        website_acts, name, remove_diacritics=True
-                    )
-                    logger.info(f"matched '{name}' with diacritics removed")
-                except ValueError:
-                    logger.error(f"could not match '{name}' to any of website's acts")
+            name = remove_friends_night_tag(act.name)
+            match = matches.get(key)
+            if match is not None and (match["pinned"] or match["name"] == name):
+                if match["program"] in programs_by_id:
+                    descriptions[key] = programs_by_id[match["program"]]["description"]
                     continue
+                if match["pinned"]:
+                    logger.error(f"pinned program {match['program']} of '{name}' is gone")
+                    continue
+            names[key] = name
+
+        new_matches: dict[str, dict[str, Any] | None] = {}
+        if names:
+            logger.info(f"matching {len(names)} acts to website's acts")
+            found = dict(
+                zip(names, zpfwebsite.ProgramMatcher(website_acts).match_all(names.values()))
+            )
+            unmatched = [key for key, match in found.items() if match is None]
+            if unmatched:
+                matcher = zpfwebsite.ProgramMatcher(website_acts, remove_diacritics=True)
+                for key, match in zip(unmatched, matcher.match_all(names[k] for k in unmatched)):
+                    if match is not None:
+                        logger.info(f"matched '{names[key]}' with diacritics removed")
+                        found[key] = match
+            for key, match in found.items():
+                if match is None:
+                    logger.error(f"could not match '{names[key]}' to any of website's acts")
+                    new_matches[key] = None
+                    continue
+                best, score = match
+                descriptions[key] = best["description"]
+                new_matches[key] = {
+                    "program": best.get("id"),
+                    "name": names[key],
+                    "score": round(score, 3),
+                    "pinned": False,
+                }
 
-            descriptions[key] = best["description"]
-
+        described_keys = []
         with programme_storage.lock() as programme:
             programme_acts = programme.get("acts", {})
             assert isinstance(programme_acts, dict)
@@ -200,36 +360,185 @@ def create_app(
                 if key not in programme_acts:
                     programme_acts[key] = {}
                 act = programme_acts[key]
-                act["description_html"] = description
+                # converting is expensive, so only do it when the description changed
+                if "description" not in act or act.get("description_html") != description:
+                    act["description_html"] = description
+                    act["description"] = (
+                        html_description_to_text(description) if description is not None else None
+                    )
+                    described_keys.append(key)
+            programme_matches = programme.setdefault("matches", {})
+            for key, match in new_matches.items():
+                # don't overwrite matches pinned in the meantime
+                if programme_matches.get(key, {}).get("pinned"):
+                    continue
+                if match is None:
+                    programme_matches.pop(key, None)
+                else:
+                    programme_matches[key] = match
             programme_storage.save()
+            generation = programme_storage.generation
+        if website_acts is not None:
+            described_acts_generation = acts.generation
+        if described_keys:
+            rebuild_legacy_programmes()
+            events.publish("programme", acts=sorted(described_keys), generation=generation)
+
+    # compressed bodies of the responses with an ETag, see `make_conditional`
+    compressed_bodies = CompressionCache(app.config["COMPRESSION_CACHE_SIZE"])
+
+    # generations start over when the process restarts, so make the ETags unique per process
+    etag_prefix = uuid.uuid4().hex[:8]
+
+    def make_etag(*snapshots: storage.Snapshot) -> str:
+        if multi_process:
+            # generations differ per process, so clients can't switch processes with those
+            return "-".join(snapshot.digest.hex()[:16] for snapshot in snapshots)
+        return "-".join([etag_prefix, *(str(snapshot.generation) for snapshot in snapshots)])
+
+    def make_conditional(
+        etag: str | None, make_response: Callable[[], Response], compress: bool = False
+    ) -> Response:
+        """Answers 304 Not Modified if the client has `etag`, otherwise calls `make_response`
+
+        Passing `None` disables conditional handling, for data which doesn't have a generation.
+        With `compress`, the response is compressed if the client accepts that, once per `etag`.
+        """
+        encoding = choose_encoding(request.accept_encodings) if compress else None
+        if etag is not None and request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = make_response()
+            if etag is not None and encoding is not None and response.status_code == 200:
+                # bodies may depend on the host, like the UIDs of iCal events
+                key = (request.host, request.full_path)
+                compressed_bodies.compress_response(response, key, etag, encoding)
+        if compress:
+            response.vary.add("Accept-Encoding")
+        if etag is not None and response.status_code in (200, 304):
+            # the compressed representation is only semantically equivalent
+            response.set_etag(etag, weak=encoding is not None)
+            # clients may store the response, but have to revalidate before each use
+            response.headers["Cache-Control"] = "no-cache"
+        return response
 
-    if app.config["UPDATE_PROGRAMME"]:
-        # make sure we always do one at startup, but don't block server
-        def do_initial_fetch():
-            update_acts()
-            update_act_descriptions()
-            with acts_storage.lock() as acts:
-                initialize_nonexistent_act_itineraries(acts)
+    def make_legacy_programme(stage=None) -> PrebuiltJson:
+        """Builds the programme (combined descriptions and itinerary) in legacy format
 
-        t = threading.Thread(name="initial_fetch", target=do_initial_fetch, daemon=True)
-        t.start()
+        This is the format which is still used by the data entry frontend and the AmigoText itself.
+        As this is expensive, request handlers should use `get_legacy_programme` instead.
+        """
+        fallback = ""
+        acts_snapshot, programme_snapshot = storage.snapshots(acts_storage, programme_storage)
+        acts, programme = acts_snapshot.data, programme_snapshot.data
+        etag = make_etag(acts_snapshot, programme_snapshot)
+        legacy_programme: dict[str, dict[str, Any]] = {}
+        legacy_programme["acts"] = legacy_acts = {}
+
+        # Use acts as lead (as this comes from the production planner)
+        for act in parsed_acts.get(acts, acts_snapshot.generation):
+            key = act.key
+            programme_act = programme["acts"].get(key, {})
+            html = programme_act.get("description_html") or fallback
+            text = programme_act.get("description") or fallback
+
+            shows = [
+                legacy_show(show)
+                for show in act.shows
+                if stage is None or show.legacy_stage == stage
+            ]
+            legacy_act = {
+                "name": act.name,
+                "shows": shows,
+                "description_html": html,
+                "description": text,
+            }
+
+            if stage is None or shows:
+                legacy_acts[key] = legacy_act
+
+        body = app.json.response(legacy_programme).get_data()
+        return PrebuiltJson(legacy_programme, body, etag)
+
+    def make_programme_slice(stage: str | None, day: int | None) -> PrebuiltJson:
+        """Builds the programme in legacy format, limited to a stage and/or festival day
+
+        Unlike `make_legacy_programme`, this uses the show index, so it only takes time
+        proportional to the result.
+        """
+        acts_snapshot, programme_snapshot = storage.snapshots(acts_storage, programme_storage)
+        programme = programme_snapshot.data
+        etag = make_etag(acts_snapshot, programme_snapshot)
+        index = parsed_acts.index(acts_snapshot.data, acts_snapshot.generation)
+        legacy_acts: dict[str, dict[str, Any]] = {}
+        for act, show in index.shows(stage, day):
+            if act.key not in legacy_acts:
+                programme_act = programme["acts"].get(act.key, {})
+                legacy_acts[act.key] = {
+                    "name": act.name,
+                    "shows": [],
+                    "description_html": programme_act.get("description_html") or "",
+                    "description": programme_act.get("description") or "",
+                }
+            legacy_acts[act.key]["shows"].append(legacy_show(show))
 
-        scheduler.add_job(update_acts, "interval", minutes=10)
-        scheduler.add_job(update_act_descriptions, "interval", minutes=60)
-        scheduler.start()
+        legacy_programme = {"acts": legacy_acts}
+        return PrebuiltJson(legacy_programme, app.json.response(legacy_programme).get_data(), etag)
 
-    @app.route("/")
-    @login_required
-    def serve_index():
-        """Main page handler"""
-        programme = make_legacy_programme("AMIGO")
+    # materialized per stage, rebuilt only when the underlying data changes
+    legacy_programme_views = {
+        stage: MaterializedView(partial(make_legacy_programme, stage)) for stage in LEGACY_STAGES
+    }
+
+    def rebuild_legacy_programmes(stages: Iterable[str] | None = None):
+        """Rebuilds the programme views of `stages`, or all"""
+        stages = list(legacy_programme_views if stages is None else stages)
+        for stage in stages:
+            legacy_programme_views[stage].rebuild()
+        if "AMIGO" in stages:
+            prerender_index()
+
+    # rendered index pages, by programme ETag and dev mode, only for the latest programme
+    index_pages: dict[tuple[str, bool], str] = {}
+    index_pages_lock = threading.Lock()
+    # for rendering outside of requests, URLs are built like for the last request
+    index_base_url: str | None = None
+
+    def get_index(programme: PrebuiltJson, dev_mode: bool) -> str:
+        key = (programme.etag, dev_mode)
+        with index_pages_lock:
+            html = index_pages.get(key)
+        if html is None:
+            html = render_index(programme, dev_mode)
+            with index_pages_lock:
+                if any(etag != programme.etag for etag, _ in index_pages):
+                    index_pages.clear()
+                index_pages[key] = html
+        return html
+
+    def prerender_index():
+        """Renders the index page for the current programme in the background
+
+        After a change, all TVs reload the page at about the same time, this makes sure they all
+        get the page which is rendered only once.
+        """
+        if index_base_url is None:
+            return
+
+        def render():
+            with app.test_request_context(base_url=index_base_url):
+                get_index(get_legacy_programme("AMIGO"), dev_mode=False)
+
+        threading.Thread(name="prerender_index", target=render, daemon=True).start()
+
+    def render_index(programme: PrebuiltJson, dev_mode: bool) -> str:
         acts_by_day = OrderedDict()
 
         def get_first_show_start_utc(item: tuple[str, dict[str, Any]]):
             shows: list[dict[str, str]] = item[1]["shows"]
             return sorted(shows, key=lambda show: show["start_utc"])[0]["start_utc"]
 
-        acts = OrderedDict(sorted(programme["acts"].items(), key=get_first_show_start_utc))
+        acts = OrderedDict(sorted(programme.data["acts"].items(), key=get_first_show_start_utc))
 
         for key, act in acts.items():
             for show in act["shows"]:
@@ -237,26 +546,137 @@ def create_app(
                 if day not in acts_by_day:
                     acts_by_day[day] = {}
                 if key not in acts_by_day[day]:
-                    acts_by_day[day][key] = act.copy()
+                    acts_by_day[day][key] = act
 
-        fetch_time = programme.get("fetch_time", None)
+        fetch_time = programme.data.get("fetch_time", None)
         if fetch_time is not None:
-            fetch_time = datetime.datetime.fromisoformat(programme["fetch_time"])
-        else:
-            fetch_time = None
-
-        dev_mode_display = "block" if "devMode" in request.args else "none"
+            fetch_time = datetime.datetime.fromisoformat(fetch_time)
 
         free_fields = []
         return render_template(
             "index.html",
             acts_by_day=acts_by_day,
-            dev_mode_display=dev_mode_display,
-            version=get_version(),
+            dev_mode_display="block" if dev_mode else "none",
+            version=version,
             fetch=fetch_time,
             free_fields=free_fields,
         )
 
+    # also used by the tests, to run them on demand
+    app.extensions["ingest_jobs"] = {
+        "update_acts": update_acts,
+        "update_act_descriptions": update_act_descriptions,
+    }
+
+    def start_ingest():
+        # make sure we always do one at startup, but don't block server
+        def do_initial_fetch():
+            # the website's programs don't depend on the acts, so fetch them in the meantime (any
+            # error is reported when update_act_descriptions tries again)
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix="initial_fetch") as executor:
+                executor.submit(api.get_programs, "Amigo")
+                update_acts()
+            run_descriptions_job_now()
+            initialize_nonexistent_act_itineraries()
+
+        scheduler.add_job(update_acts, "interval", minutes=10)
+        # one job, which is run early when needed, so the updates never overlap
+        scheduler.add_job(
+            update_act_descriptions,
+            "interval",
+            minutes=60,
+            id=DESCRIPTIONS_JOB_ID,
+            max_instances=1,
+            replace_existing=True,
+        )
+        scheduler.start()
+
+        t = threading.Thread(name="initial_fetch", target=do_initial_fetch, daemon=True)
+        t.start()
+
+    def run_descriptions_job_now():
+        scheduler.modify_job(
+            DESCRIPTIONS_JOB_ID, next_run_time=datetime.datetime.now(datetime.timezone.utc)
+        )
+
+    def describe_soon():
+        """Makes the next description update a full one, and runs it right away
+
+        That is, only in the process which runs the ingest jobs, the others leave it to that one.
+        """
+        nonlocal described_acts_generation
+        described_acts_generation = None
+        if app.config["UPDATE_PROGRAMME"] and scheduler.running:
+            run_descriptions_job_now()
+
+    def watch_storages():
+        """Takes over what other processes saved, and notifies this process' clients"""
+        storages = [acts_storage, programme_storage, itinerary_storage]
+        while True:
+            time.sleep(app.config["MULTI_PROCESS_CHECK_SECONDS"])
+            matches = programme_storage.snapshot().data.get("matches", {})
+            try:
+                changed = [storage for storage in storages if storage.reload()]
+            except Exception:
+                logger.exception("reloading storages failed")
+                continue
+            if matches != programme_storage.snapshot().data.get("matches", {}):
+                # pinned in another process, which leaves the descriptions to this one
+                describe_soon()
+            if acts_storage in changed or programme_storage in changed:
+                rebuild_legacy_programmes()
+                events.publish(
+                    "programme", generation=acts_storage.generation, stages=None, acts=None
+                )
+            if itinerary_storage in changed or acts_storage in changed:
+                events.publish(
+                    "itinerary", act=None, acts=None, generation=itinerary_storage.generation
+                )
+
+    if multi_process:
+        threading.Thread(name="watch_storages", target=watch_storages, daemon=True).start()
+
+    if app.config["UPDATE_PROGRAMME"] and not multi_process:
+        start_ingest()
+    elif app.config["UPDATE_PROGRAMME"]:
+        # only one of the processes fetches, the one which holds the lock (until it exits)
+        scheduler_lock = filelock.FileLock(
+            os.path.join(app.instance_path, "scheduler.lock"), thread_local=False
+        )
+        # it's released when garbage collected
+        app.extensions["scheduler_lock"] = scheduler_lock
+
+        def take_over_ingest():
+            # when the process which runs the jobs exits, one of the others takes over
+            scheduler_lock.acquire(poll_interval=app.config["MULTI_PROCESS_CHECK_SECONDS"])
+            logger.info(f"process {os.getpid()} takes over the ingest jobs")
+            start_ingest()
+
+        try:
+            scheduler_lock.acquire(blocking=False)
+        except filelock.Timeout:
+            threading.Thread(name="take_over_ingest", target=take_over_ingest, daemon=True).start()
+        else:
+            logger.info(f"process {os.getpid()} runs the ingest jobs")
+            start_ingest()
+
+    @app.route("/")
+    @login_required
+    def serve_index():
+        """Main page handler"""
+        nonlocal index_base_url
+        index_base_url = request.host_url.rstrip("/") + request.script_root + "/"
+        dev_mode = "devMode" in request.args
+        programme = get_legacy_programme("AMIGO")
+        if programme.etag is None:
+            return render_index(programme, dev_mode)
+        etag = f"{programme.etag}-{int(dev_mode)}"
+        return make_conditional(
+            etag,
+            lambda: Response(get_index(programme, dev_mode), mimetype="text/html"),
+            compress=True,
+        )
+
     DYNAMIC_TEST_ACT_KEY = "__test__"
 
     def dynamic_test_act_enabled() -> bool:
@@ -296,66 +716,85 @@ def create_app(
             "linecheck": (fake_start_local - datetime.timedelta(minutes=30)).strftime("%H:%M"),
         }
 
+    def get_legacy_programme(stage: str) -> PrebuiltJson:
+        """Returns the prebuilt legacy programme for a stage, without taking any storage lock"""
+        programme = legacy_programme_views[stage].get()
+        if not dynamic_test_act_enabled():
+            return programme
+
+        data = programme.data.copy()
+        data["acts"] = data["acts"].copy()
+        key, test_item = make_dynamic_test_programme_item()
+        data["acts"][key] = test_item
+        return PrebuiltJson(data, app.json.response(data).get_data())
+
+    def get_programme(stage: str) -> PrebuiltJson:
+        """Returns the legacy programme of any stage"""
+        if stage in legacy_programme_views:
+            return get_legacy_programme(stage)
+        return make_programme_slice(stage, None)
+
+    def programme_etag(stage: str) -> str | None:
+        """ETag for `get_programme`, to be determined *before* getting the programme"""
+        if stage in legacy_programme_views:
+            return get_legacy_programme(stage).etag
+        return make_etag(*storage.snapshots(acts_storage, programme_storage))
+
     @app.route("/programme")
     def serve_programme():
-        programme = make_legacy_programme("AMIGO")
-        response = make_response(programme)
-        return response
+        """The legacy programme, of the Amigo unless another `stage` is given
 
-    def make_legacy_programme(stage=None) -> dict[str, dict[str, Any]]:
-        """Returns the programme (combined descriptions and itinerary) in legacy format
-
-        This is the format which is still used by the data entry frontend and the AmigoText itself.
+        With `day` (e.g. "zaterdag"), only the shows of that festival day are included.
         """
-        fallback = ""
-        with acts_storage.lock() as acts, programme_storage.lock() as programme:
-            legacy_programme: dict[str, dict[str, Any]] = {}
-            legacy_programme["acts"] = legacy_acts = {}
-
-            # Use acts as lead (as this comes from the production planner)
-            for act in acts:
-                key = str(act["id"])
-                try:
-                    html = programme["acts"][key]["description_html"]
-                    if html is None:
-                        html = fallback
-                except KeyError:
-                    html = fallback
-
-                shows = []
-                legacy_act = {
-                    "name": act["name"],
-                    "shows": shows,
-                    "description_html": html,
-                    "description": _html_description_to_text(html),
-                }
-                timeline: list[dict[str, Any]] = act["timeline"]
-                for event in timeline:
-                    if event["type"] == "Showtime":
-                        event_stage = event["stage"]
-                        show_stage = event_stage.upper() if event_stage is not None else None
-                        if stage is not None and show_stage != stage:
-                            continue
-                        show = {"stage": show_stage}
-                        times = act_event_to_legacy_times(event)
-                        show["start"] = times[0]
-                        show["end"] = times[1]
-                        start = act_datestr_to_datetime(event["start"])
-                        end = act_datestr_to_datetime(event["end"])
-                        show["start_utc"] = int(start.timestamp())
-                        show["end_utc"] = int(end.timestamp())
-                        show["day"] = LEGACY_DAYS[festival_weekday(start)]
-
-                        shows.append(show)
-
-                if stage is None or shows:
-                    legacy_acts[key] = legacy_act
+        stage = request.args.get("stage", "AMIGO").upper()
+        day = request.args.get("day")
+        if day is not None and day not in LEGACY_WEEKDAYS:
+            return Response(f"Unknown day '{day}'", status=400)
+        if day is None:
+            etag = programme_etag(stage)
+        else:
+            etag = make_etag(*storage.snapshots(acts_storage, programme_storage))
 
-        if dynamic_test_act_enabled():
-            key, test_item = make_dynamic_test_programme_item()
-            legacy_programme["acts"][key] = test_item
+        def make_response():
+            if day is None:
+                programme = get_programme(stage)
+            else:
+                programme = make_programme_slice(stage, LEGACY_WEEKDAYS[day])
+            return Response(programme.body, mimetype="application/json")
+
+        return make_conditional(etag, make_response, compress=True)
+
+    def static_file_version(filename: str) -> tuple[pathlib.Path, tuple[int, int]]:
+        path = pathlib.Path(safe_join(app.static_folder, filename))
+        stat = path.stat()
+        return path, (stat.st_mtime_ns, stat.st_size)
+
+    def serve_static(filename: str) -> Response:
+        """Flask's static file route, but text files are compressed if the client accepts that"""
+        response = app.send_static_file(filename)
+        response.vary.add("Accept-Encoding")
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None or not is_compressible(response.mimetype):
+            return response
+        if response.status_code == 200:
+            path, file_version = static_file_version(filename)
+            compressed_bodies.compress_response(
+                response, ("static", filename), file_version, encoding, path.read_bytes
+            )
+        if response.status_code in (200, 304):
+            # like in `make_conditional`
+            response.set_etag(response.get_etag()[0], weak=True)
+        return response
 
-        return legacy_programme
+    app.view_functions["static"] = serve_static
+
+    # the static files only change with a new version, so compress them up front
+    for path in pathlib.Path(app.static_folder).rglob("*"):
+        if path.is_file() and is_compressible(mimetypes.guess_type(path)[0]):
+            filename = path.relative_to(app.static_folder).as_posix()
+            _, file_version = static_file_version(filename)
+            for encoding in COMPRESSORS:
+                compressed_bodies.get(("static", filename), file_version, encoding, path.read_bytes)
 
     @app.route("/generate-ical-url")
     def serve_ical_ui():
@@ -363,43 +802,68 @@ def create_app(
 
     @app.route("/programme.ics")
     def serve_ical():
+        days = request.args.get("days", "woensdag;donderdag;vrijdag;zaterdag;zondag").split(";")
+        reminders = []
+        for value in request.args.get("reminders", "").split(";"):
+            if not value:
+                continue
+            try:
+                reminders.append(ReminderDefinition.from_urlparam(value))
+            except ValueError:
+                return Response("Error in reminder definition", status=400)
+        if not reminders:
+            reminders.append(ReminderDefinition("start_utc", -6))
+            reminders.append(ReminderDefinition("end_utc", -6))
+
+        # normalize, so equivalent requests share a cache entry
+        params = IcalParameters(
+            stage=request.args.get("stage", "AMIGO").upper(),
+            days=tuple(sorted(set(days))),
+            reminders=tuple(dict.fromkeys(reminders)),
+            enable_reminders=bool(int(request.args.get("enable_reminders", 1))),
+            hostname=urlparse(request.base_url).hostname,
+        )
+
+        stage_etag = programme_etag(params.stage)
+        etag = None
+        if stage_etag is not None:
+            etag = f"{stage_etag}-{itinerary_etag()}"
+
+        def make_response():
+            try:
+                if etag is None:
+                    # depends on more than the generations, don't cache
+                    ical = render_ical.__wrapped__(params, etag)
+                else:
+                    ical = render_ical(params, etag)
+            except KeyError as e:
+                return Response(f"Timestamp key '{e.args[0]}' doesn't exist", status=400)
+            headers = {
+                "Cache-Control": "no-cache",
+            }
+            return Response(ical, headers=headers, mimetype="text/calendar")
+
+        return make_conditional(etag, make_response, compress=True)
+
+    @lru_cache(maxsize=app.config["ICAL_CACHE_SIZE"])
+    def render_ical(params: "IcalParameters", etag: str | None) -> bytes:
+        """Renders the iCalendar feed, `etag` is only used as part of the cache key"""
         cal = icalendar.Calendar()
         cal.add("PRODID", "-//amigotext//NONSGML amigotext.app.event//EN")
         cal.add("VERSION", "2.0")
-        hostname = urlparse(request.base_url).hostname
-        days = request.args.get("days", "woensdag;donderdag;vrijdag;zaterdag;zondag").split(";")
-        programme = make_legacy_programme("AMIGO")
+        programme = get_programme(params.stage).data
         itinerary = make_legacy_itinerary()
         for key, act in programme["acts"].items():
             for show in act["shows"]:
-                if show["day"] not in days:
+                if show["day"] not in params.days:
                     continue
-                event = create_ical_event(key, act, show, itinerary, hostname)
-
-                reminders = []
-                for value in request.args.get("reminders", "").split(";"):
-                    if not value:
-                        continue
-                    try:
-                        reminders.append(ReminderDefinition.from_urlparam(value))
-                    except ValueError:
-                        return Response("Error in reminder definition", status=400)
-                if not reminders:
-                    reminders.append(ReminderDefinition("start_utc", -6))
-                    reminders.append(ReminderDefinition("end_utc", -6))
-
-                if int(request.args.get("enable_reminders", 1)):
-                    try:
-                        add_ical_reminders(show, event, reminders)
-                    except KeyError as e:
-                        return Response(f"Timestamp key '{e.args[0]}' doesn't exist", status=400)
+                event = create_ical_event(key, act, show, itinerary, params.hostname)
+                if params.enable_reminders:
+                    add_ical_reminders(show, event, params.reminders)
 
                 cal.add_component(event)
 
-        headers = {
-            "Cache-Control": "no-cache, no-store",
-        }
-        return Response(cal.to_ical(), headers=headers, mimetype="text/calendar")
+        return cal.to_ical()
 
     LEGACY_ITINERARY_KEYS = {
         "Get in": "get_in",
@@ -409,11 +873,13 @@ def create_app(
 
     @app.route("/itinerary/<act_key>", methods=["GET"])
     def serve_dressing_room(act_key):
-        itinerary = make_legacy_itinerary()
-        if act_key not in itinerary:
-            return Response("Act does not exist", status=404)
+        def make_response():
+            itinerary = make_legacy_itinerary()
+            if act_key not in itinerary:
+                return Response("Act does not exist", status=404)
+            return jsonify(itinerary[act_key])
 
-        return jsonify(itinerary[act_key])
+        return make_conditional(itinerary_etag(), make_response)
 
     @app.route("/itinerary/<act_key>/<item>", methods=["PUT"])
     @login_required
@@ -421,30 +887,118 @@ def create_app(
         if item != "dressing_room":
             return Response("everything except dressing_room is read-only", status=405)
 
+        try:
+            changed = itinerary_storage.set_item([act_key, item], request.data.decode("utf-8"))
+        except KeyError:
+            return Response("Act does not exist", status=404)
+        if changed:
+            events.publish(
+                "itinerary", act=act_key, acts=[act_key], generation=itinerary_storage.generation
+            )
+        return "success"
+
+    @app.route("/itinerary", methods=["PATCH"])
+    @login_required
+    def update_dressing_rooms():
+        """Updates the itinerary items of several acts at once, e.g. to import a room plan
+
+        The body maps act keys to their items to set, like `{"foo": {"dressing_room": "Room 1"}}`.
+        Either all of them are set, with a single save, or none. The response is the resulting
+        legacy itinerary entries of these acts.
+        """
+        updates = request.get_json(silent=True)
+        if not isinstance(updates, dict) or not all(
+            isinstance(items, dict) and all(isinstance(value, str) for value in items.values())
+            for items in updates.values()
+        ):
+            return Response("body must map act keys to items to set", status=400)
+        if any(item != "dressing_room" for items in updates.values() for item in items):
+            return Response("everything except dressing_room is read-only", status=405)
+
         with itinerary_storage.lock() as itinerary:
-            if act_key not in itinerary:
+            if any(act_key not in itinerary for act_key in updates):
                 return Response("Act does not exist", status=404)
-            itinerary[act_key][item] = request.data.decode("utf-8")
+            changed = [
+                act_key
+                for act_key, items in updates.items()
+                if any(itinerary[act_key].get(item) != value for item, value in items.items())
+            ]
+            for act_key in changed:
+                itinerary[act_key].update(updates[act_key])
             itinerary_storage.save()
-        return "success"
+        if changed:
+            events.publish(
+                "itinerary",
+                act=changed[0] if len(changed) == 1 else None,
+                acts=sorted(changed),
+                generation=itinerary_storage.generation,
+            )
+
+        legacy_itinerary = make_legacy_itinerary()
+        return jsonify({act_key: legacy_itinerary[act_key] for act_key in updates})
+
+    @app.route("/matches")
+    @login_required
+    def serve_matches():
+        """The website programs the acts are matched to, see `update_act_descriptions`"""
+        return jsonify(programme_storage.snapshot().data.get("matches", {}))
+
+    @app.route("/matches/<act_key>", methods=["PUT"])
+    @login_required
+    def pin_match(act_key):
+        """Pins the act to the website program with the ID in the body, or unpins if empty"""
+        acts = {str(act["id"]): act for act in acts_storage.snapshot().data}
+        if act_key not in acts:
+            return Response("Act does not exist", status=404)
+        body = request.data.decode("utf-8").strip()
+        try:
+            program = int(body) if body else None
+        except ValueError:
+            return Response("program ID must be an integer", status=400)
+
+        with programme_storage.lock() as programme:
+            matches = programme.setdefault("matches", {})
+            if program is None:
+                matches.pop(act_key, None)
+            else:
+                matches[act_key] = {
+                    "program": program,
+                    "name": remove_friends_night_tag(acts[act_key]["name"]),
+                    "score": None,
+                    "pinned": True,
+                }
+            programme_storage.save()
+            match = matches.get(act_key)
+
+        # update the description right away (or the process which runs the ingest jobs does)
+        describe_soon()
+        return jsonify(match)
 
     @app.route("/itinerary")
     def serve_dressing_rooms():
-        return make_legacy_itinerary()
+        return make_conditional(
+            itinerary_etag(), lambda: jsonify(make_legacy_itinerary()), compress=True
+        )
+
+    def itinerary_etag() -> str | None:
+        """ETag for the legacy itinerary, to be determined *before* getting the itinerary"""
+        if dynamic_test_act_enabled():
+            return None
+        return make_etag(*storage.snapshots(itinerary_storage, acts_storage))
 
     def make_legacy_itinerary():
-        with itinerary_storage.lock() as itinerary, acts_storage.lock() as acts:
-            full_itinerary = itinerary.copy()
-
-            for act in acts:
-                key = str(act["id"])
-                itin_item = full_itinerary.get(key, {})
-                for event in act["timeline"]:
-                    eventtype = event["type"]
-                    if eventtype in LEGACY_ITINERARY_KEYS:
-                        itin_item[LEGACY_ITINERARY_KEYS[eventtype]] = act_datestr_to_legacy_time(
-                            event["start"]
-                        )
+        itinerary_snapshot, acts_snapshot = storage.snapshots(itinerary_storage, acts_storage)
+        full_itinerary = itinerary_snapshot.data.copy()
+
+        for act in parsed_acts.get(acts_snapshot.data, acts_snapshot.generation):
+            key = act.key
+            if key not in full_itinerary:
+                continue
+            # the snapshot is shared, so don't modify its items
+            full_itinerary[key] = itin_item = full_itinerary[key].copy()
+            for event in act.timeline:
+                if event.type in LEGACY_ITINERARY_KEYS:
+                    itin_item[LEGACY_ITINERARY_KEYS[event.type]] = event.legacy_start
 
         if dynamic_test_act_enabled():
             key, test_item = make_dynamic_test_act_itinerary_item()
@@ -452,6 +1006,86 @@ def create_app(
 
         return full_itinerary
 
+    @app.route("/changes")
+    def serve_changes():
+        """The programme and itinerary entries of the acts which changed after event `since`
+
+        `since` is the ID of an event (see `serve_events`) or of an earlier response, and `id` in
+        the response is what to pass next time. Acts which were removed (or aren't in the programme
+        of `stage`) are null. If the changes since then aren't known anymore, the response is the
+        full programme and itinerary, with `full` set.
+        """
+        try:
+            since = int(request.args["since"])
+        except (KeyError, ValueError):
+            return Response("since must be an event ID", status=400)
+        stage = request.args.get("stage", "AMIGO").upper()
+
+        # determined before getting the data, so nothing is missed next time
+        last_id = events.last_id
+        new_events = events.events_since(since)
+        # the changed keys per event type, None if everything may have changed
+        changed: dict[str, set[str] | None] = {"programme": set(), "itinerary": set()}
+        if new_events is not None:
+            last_id = new_events[-1].id if new_events else since
+            for event in new_events:
+                keys = changed.get(event.type, set())
+                if keys is None:
+                    continue
+                if event.data.get("acts") is None:
+                    changed[event.type] = None
+                else:
+                    keys.update(event.data["acts"])
+
+        programme = get_programme(stage).data["acts"]
+        itinerary = make_legacy_itinerary()
+
+        def select(data: dict[str, Any], keys: set[str] | None) -> dict[str, Any]:
+            if new_events is None or keys is None:
+                return data
+            return {key: data.get(key) for key in sorted(keys)}
+
+        return jsonify(
+            {
+                "id": last_id,
+                "full": new_events is None,
+                "programme": select(programme, changed["programme"]),
+                "itinerary": select(itinerary, changed["itinerary"]),
+            }
+        )
+
+    # the streams are served by a server of their own, see `serve_events`
+    event_stream_server = EventStreamServer(
+        events,
+        app.config["EVENTS_HOST"],
+        app.config["EVENTS_PORT"],
+        retry_seconds=app.config["EVENTS_RETRY_SECONDS"],
+        keepalive_seconds=app.config["EVENTS_KEEPALIVE_SECONDS"],
+        hold_seconds=app.config["EVENTS_HOLD_SECONDS"],
+    )
+    event_stream_server.start()
+
+    @app.route("/events")
+    def serve_events():
+        """Stream of change notices (Server-Sent Events)
+
+        `programme` events mean the programme changed, `itinerary` events mean the itinerary of
+        the given act changed (all acts if `act` is null). `acts` lists the keys of the changed
+        acts, null if they may all have changed, see also `serve_changes`. A `reset` event means
+        the client was away for too long to catch up, and should refetch everything.
+
+        Streams stay open for as long as the clients are there, which would occupy a worker thread
+        each, so this redirects to the `EventStreamServer` on `EVENTS_PORT` (or `EVENTS_URL`).
+        """
+        url = app.config["EVENTS_URL"]
+        if url is None:
+            hostname = urlparse(request.base_url).hostname
+            if ":" in hostname:
+                hostname = f"[{hostname}]"
+            url = f"{request.scheme}://{hostname}:{event_stream_server.port}/events"
+        # 307 keeps the method and headers, i.e. Last-Event-ID
+        return flask.redirect(url, code=307)
+
     @login_manager.user_loader
     def load_user(user_id):
         user = users.TheUser(app.config["USERNAME"], app.config["PASSWORD"])
@@ -510,7 +1144,7 @@ def create_ical_event(key, act, show, itinerary, hostname):
     return event
 
 
-def add_ical_reminders(show, event, reminders: list["ReminderDefinition"]):
+def add_ical_reminders(show, event, reminders: Iterable["ReminderDefinition"]):
     for reminder in reminders:
         alarm = icalendar.Alarm()
         reference = datetime.datetime.fromtimestamp(show[reminder.reference], tz=datetime.UTC)
@@ -518,13 +1152,19 @@ def add_ical_reminders(show, event, reminders: list["ReminderDefinition"]):
         alarm.add("TRIGGER", trigger)
         alarm.add("ACTION", "DISPLAY")
         alarm.add("DESCRIPTION", "Reminder")
-        alarm_uid = str(uuid.uuid4())
+        # derived from the event and reminder, so the alarm keeps its identity across fetches
+        alarm_uid = str(
+            uuid.uuid5(
+                uuid.NAMESPACE_URL,
+                f"{event['UID']}/{reminder.reference}/{reminder.offset_minutes}",
+            )
+        )
         alarm.add("UID", alarm_uid)
         alarm.add("X-WR-ALARMUID", alarm_uid)
         event.add_component(alarm)
 
 
-@dataclass
+@dataclass(frozen=True)
 class ReminderDefinition:
     reference: str
     offset_minutes: int
@@ -535,22 +1175,44 @@ class ReminderDefinition:
         return cls(reference, int(offset))
 
 
-def hour_minute(time: str):
-    return int(time[0:2]), int(time[3:5])
-
-
-def act_event_to_legacy_times(event: dict[str, str]):
-    return act_datestr_to_legacy_time(event["start"]), act_datestr_to_legacy_time(event["end"])
-
-
-def act_datestr_to_legacy_time(datestr: str):
-    return datestr[11:16]
+@dataclass(frozen=True)
+class IcalParameters:
+    stage: str
+    days: tuple[str, ...]
+    reminders: tuple[ReminderDefinition, ...]
+    enable_reminders: bool
+    hostname: str | None
+
+
+def html_description_to_text(html_description: str) -> str:
+    # ensure we keep separation between paragraphs
+    html_description = html_description.replace("<p>", "\n\n")
+    # remove remaining tags
+    # use html.parser to not be dependant on lxml, which is harder to install for some targets,
+    # as it contains C code
+    return bs4.BeautifulSoup(html_description, "html.parser").get_text().strip()
+
+
+def legacy_show(show: TimelineEvent) -> dict[str, Any]:
+    return {
+        "stage": show.legacy_stage,
+        "start": show.legacy_start,
+        "end": show.legacy_end,
+        "start_utc": show.start_utc,
+        "end_utc": show.end_utc,
+        "day": LEGACY_DAYS[show.day],
+    }
 
 
-def act_datestr_to_datetime(datestr: str):
-    return datetime.datetime.strptime(datestr + " +0200", "%Y-%m-%d %H:%M:%S %z")
+def show_stages(acts: Iterable[dict[str, Any]]) -> set[str | None]:
+    """Returns the (legacy) stages the acts have shows on"""
+    return {
+        event["stage"].upper() if event["stage"] is not None else None
+        for act in acts
+        for event in act["timeline"]
+        if event["type"] == "Showtime"
+    }
 
 
-def festival_weekday(timepoint: datetime.datetime):
-    """Returns the `datetime` day of week for a timepoint, assuming 06:00 for start of new day"""
-    return (timepoint - datetime.timedelta(hours=6)).weekday()
+def hour_minute(time: str):
+    return int(time[0:2]), int(time[3:5])
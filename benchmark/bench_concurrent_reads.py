@@ -0,0 +1,69 @@
+"""Measures read throughput while the itinerary is being edited, for several waitress thread counts
+
+Run with `python -m benchmark.bench_concurrent_reads`.
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from benchmark.festival_data import make_festival, write_instance
+from test.conftest import create_session, start_app_waitress
+
+
+def measure(threads: int, clients: int, duration: float, port: int, acts: int, seed: int) -> float:
+    # many acts make saving (which the writer does while holding the lock) heavier
+    festival = make_festival(acts, seed)
+    key = festival.acts[0]["id"]
+    with tempfile.TemporaryDirectory() as instance:
+        write_instance(festival, Path(instance))
+        with start_app_waitress(Path(instance), port, threads) as host:
+            stop = threading.Event()
+            counts = [0] * clients
+
+            def editor():
+                session = create_session(host)
+                room = 0
+                while not stop.is_set():
+                    room += 1
+                    session.put(f"itinerary/{key}/dressing_room", data=str(room).encode("utf-8"))
+
+            def reader(index: int):
+                with requests.Session() as session:
+                    while not stop.is_set():
+                        session.get(f"{host}/itinerary").raise_for_status()
+                        counts[index] += 1
+
+            workers = [threading.Thread(target=editor)]
+            workers += [threading.Thread(target=reader, args=[i]) for i in range(clients)]
+            for worker in workers:
+                worker.start()
+            time.sleep(duration)
+            stop.set()
+            for worker in workers:
+                worker.join()
+
+    return sum(counts) / duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--port", type=int, default=5002)
+    parser.add_argument("--acts", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for threads in args.threads:
+        throughput = measure(threads, args.clients, args.duration, args.port, args.acts, args.seed)
+        print(f"{threads:2} waitress threads: {throughput:8.1f} reads/s")
+
+
+if __name__ == "__main__":
+    main()
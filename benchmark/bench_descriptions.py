@@ -0,0 +1,45 @@
+"""Compares converting HTML descriptions per request with serving the text converted at ingest
+
+Run with `python -m benchmark.bench_descriptions`.
+"""
+
+import argparse
+import timeit
+
+from app import html_description_to_text
+from benchmark.festival_data import make_festival
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--acts", type=int, default=250)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    festival = make_festival(args.acts, args.seed, extra_programs=0)
+    programme = {
+        str(program["id"]): {"description_html": program["description"]}
+        for program in festival.programs
+    }
+
+    def per_request():
+        return {
+            key: html_description_to_text(act["description_html"]) for key, act in programme.items()
+        }
+
+    for act in programme.values():
+        act["description"] = html_description_to_text(act["description_html"])
+
+    def at_ingest():
+        return {key: act["description"] for key, act in programme.items()}
+
+    assert per_request() == at_ingest()
+    before = min(timeit.repeat(per_request, number=1, repeat=args.repeat))
+    after = min(timeit.repeat(at_ingest, number=1, repeat=args.repeat))
+    print(f"{args.acts} acts, descriptions converted per request: {before * 1000:8.2f} ms/request")
+    print(f"{args.acts} acts, descriptions converted at ingest:   {after * 1000:8.2f} ms/request")
+
+
+if __name__ == "__main__":
+    main()
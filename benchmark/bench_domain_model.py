@@ -0,0 +1,99 @@
+"""Compares building the legacy shows from the raw acts with building them from parsed acts
+
+Run with `python -m benchmark.bench_domain_model`.
+"""
+
+import argparse
+import datetime
+import json
+import timeit
+import tracemalloc
+
+from app import LEGACY_DAYS
+from src.productionplanner import Act, festival_weekday
+from benchmark.festival_data import make_festival
+
+
+def shows_from_raw(acts: list[dict]) -> list[list[dict]]:
+    """How the legacy programme was built before parsing the acts at ingest"""
+
+    def to_datetime(datestr: str):
+        return datetime.datetime.strptime(datestr + " +0200", "%Y-%m-%d %H:%M:%S %z")
+
+    result = []
+    for act in acts:
+        shows = []
+        for event in act["timeline"]:
+            if event["type"] == "Showtime":
+                stage = event["stage"].upper() if event["stage"] is not None else None
+                start = to_datetime(event["start"])
+                end = to_datetime(event["end"])
+                shows.append(
+                    {
+                        "stage": stage,
+                        "start": event["start"][11:16],
+                        "end": event["end"][11:16],
+                        "start_utc": int(start.timestamp()),
+                        "end_utc": int(end.timestamp()),
+                        "day": LEGACY_DAYS[festival_weekday(start)],
+                    }
+                )
+        result.append(shows)
+    return result
+
+
+def shows_from_parsed(acts: list[Act]) -> list[list[dict]]:
+    return [
+        [
+            {
+                "stage": show.legacy_stage,
+                "start": show.legacy_start,
+                "end": show.legacy_end,
+                "start_utc": show.start_utc,
+                "end_utc": show.end_utc,
+                "day": LEGACY_DAYS[show.day],
+            }
+            for show in act.shows
+        ]
+        for act in acts
+    ]
+
+
+def allocated(make) -> tuple[int, object]:
+    tracemalloc.start()
+    result = make()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--acts", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    raw = make_festival(args.acts, args.seed).acts
+    parsed = [Act(act) for act in raw]
+    assert shows_from_raw(raw) == shows_from_parsed(parsed)
+
+    from_raw = min(timeit.repeat(lambda: shows_from_raw(raw), number=1, repeat=args.repeat))
+    from_parsed = min(
+        timeit.repeat(lambda: shows_from_parsed(parsed), number=1, repeat=args.repeat)
+    )
+    parsing = min(timeit.repeat(lambda: [Act(a) for a in raw], number=1, repeat=args.repeat))
+    print(f"{args.acts} acts, shows built from raw acts:    {from_raw * 1000:8.2f} ms")
+    print(f"{args.acts} acts, shows built from parsed acts: {from_parsed * 1000:8.2f} ms")
+    print(f"{args.acts} acts, parsing (once per change):    {parsing * 1000:8.2f} ms")
+
+    # what's retained by the raw acts vs. by the parsed acts (which don't keep the raw acts)
+    serialized = json.dumps(raw)
+    raw_size, _ = allocated(lambda: json.loads(serialized))
+    parsed_size, _ = allocated(lambda: [Act(act) for act in json.loads(serialized)])
+    print(f"{args.acts} acts, memory per raw act:    {raw_size / args.acts:6.0f} B")
+    print(f"{args.acts} acts, memory per parsed act: {parsed_size / args.acts:6.0f} B")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compares matching act names to website programs one by one with the batch matcher
+
+Run with `python -m benchmark.bench_matching`.
+"""
+
+import argparse
+import random
+import time
+
+from zpfwebsite import ProgramMatcher
+from zpfwebsite.test.test_api import reference_find_best_matching_program
+
+SYLLABLES = "ka lo mi ne ta ro sé zu bë de an el or the band of ö".split()
+
+
+def make_title(rng: random.Random) -> str:
+    return " ".join(
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4)))
+        for _ in range(rng.randint(1, 4))
+    ).title()
+
+
+def misspell(rng: random.Random, title: str) -> str:
+    chars = list(title)
+    position = rng.randrange(len(chars))
+    chars[position] = rng.choice("aeiou")
+    return "".join(chars)
+
+
+def match_exhaustive(programs, titles):
+    results = []
+    for title in titles:
+        try:
+            results.append(reference_find_best_matching_program(programs, title))
+        except ValueError:
+            try:
+                results.append(
+                    reference_find_best_matching_program(programs, title, remove_diacritics=True)
+                )
+            except ValueError:
+                results.append(None)
+    return results
+
+
+def match_batch(programs, titles):
+    results = ProgramMatcher(programs).find_all(titles)
+    unmatched = [i for i, result in enumerate(results) if result is None]
+    if unmatched:
+        fallback = ProgramMatcher(programs, remove_diacritics=True)
+        for i, result in zip(unmatched, fallback.find_all(titles[i] for i in unmatched)):
+            results[i] = result
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--programs", type=int, default=3000)
+    parser.add_argument("--acts", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    programs = [{"title": make_title(rng)} for _ in range(args.programs)]
+    titles = [misspell(rng, program["title"]) for program in rng.sample(programs, args.acts)]
+    titles += [make_title(rng) for _ in range(args.acts // 10)]
+
+    timings = {}
+    results = {}
+    for name, match in [("exhaustive", match_exhaustive), ("batch", match_batch)]:
+        start = time.perf_counter()
+        results[name] = match(programs, titles)
+        timings[name] = time.perf_counter() - start
+    assert all(a is b for a, b in zip(results["exhaustive"], results["batch"]))
+
+    for name, seconds in timings.items():
+        print(f"{len(titles)} titles x {args.programs} programs, {name:10} {seconds:8.2f} s")
+
+
+if __name__ == "__main__":
+    main()
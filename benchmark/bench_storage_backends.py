@@ -0,0 +1,83 @@
+"""Compares the storage backends for a large acts list and itinerary
+
+Run with `python -m benchmark.bench_storage_backends`.
+"""
+
+import argparse
+import tempfile
+import timeit
+from pathlib import Path
+
+from src.storage import CachedStorage, JournaledStorage, SqliteStorage
+from benchmark.festival_data import make_festival
+
+
+def make_backends(directory: Path) -> dict:
+    """Returns, per backend, factories for the acts and itinerary storages"""
+    return {
+        "json": (
+            lambda: CachedStorage([], directory / "acts.json"),
+            lambda: CachedStorage({}, directory / "itinerary.json"),
+        ),
+        "journal": (
+            lambda: CachedStorage([], directory / "acts.json"),
+            lambda: JournaledStorage({}, directory / "itinerary.json", compact_threshold=2**30),
+        ),
+        "sqlite": (
+            lambda: SqliteStorage([], directory / "storage.sqlite3", "acts", key_field="id"),
+            lambda: SqliteStorage({}, directory / "storage.sqlite3", "itinerary"),
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--acts", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    festival = make_festival(args.acts, args.seed)
+    acts = festival.acts
+    # an act halfway, to look up and change
+    middle = args.acts // 2
+    key = acts[middle]["id"]
+    for backend, (make_acts_storage, make_itinerary_storage) in make_backends(
+        Path(tempfile.mkdtemp())
+    ).items():
+        acts_storage = make_acts_storage()
+        with acts_storage.lock() as data:
+            data.extend(acts)
+        acts_storage.save()
+        itinerary = make_itinerary_storage()
+        with itinerary.lock() as data:
+            data.update(festival.itinerary)
+        itinerary.save()
+
+        counter = iter(range(10**9))
+
+        def set_item():
+            itinerary.set_item([key, "dressing_room"], str(next(counter)))
+
+        def save_one_changed():
+            with acts_storage.lock() as data:
+                data[middle]["name"] = f"Act {next(counter)}"
+            acts_storage.save()
+
+        def lookup():
+            if isinstance(acts_storage, SqliteStorage):
+                return acts_storage.get(key)
+            return next(a for a in acts_storage.snapshot().data if a["id"] == key)
+
+        results = {
+            "load": min(timeit.repeat(make_acts_storage, number=1, repeat=3)),
+            "set_item": min(timeit.repeat(set_item, number=1, repeat=args.repeat)),
+            "save (1 changed)": min(timeit.repeat(save_one_changed, number=1, repeat=args.repeat)),
+            "lookup by id": min(timeit.repeat(lookup, number=1, repeat=args.repeat)),
+        }
+        for operation, seconds in results.items():
+            print(f"{args.acts} acts, {backend:8} {operation:17} {seconds * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
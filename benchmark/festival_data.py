@@ -0,0 +1,176 @@
+"""Seeded generator of realistic festival data, at any scale
+
+Generates what the app keeps in its instance folder (`acts.json`, `itinerary.json` and
+`programme_cache.json`) and what the website API returns (`/programs` and `/locations`). The same
+seed and number of acts always give the same data.
+
+Run with `python -m benchmark.festival_data <directory> --acts 1000` to write it to a directory.
+"""
+
+import argparse
+import datetime
+import json
+import random
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from unidecode import unidecode
+
+from app import html_description_to_text
+
+# the Amigo has about one act in ten, the rest plays elsewhere
+STAGES = {"Amigo": 10, "Main": 25, "Bruut": 20, "Tent": 25, "Vuurwerk": 20}
+DRESSING_ROOMS = ["None", "MAIN 1", "MAIN 2", "MAIN 3", "Room 1", "Room 2", "Container"]
+# Wednesday to Sunday
+FIRST_DAY = datetime.datetime(2025, 8, 6, 12)
+DAYS = 5
+SYLLABLES = "ka lo mi ne ta ro sé zu bë de an el or the band of ö ij van kwar tet".split()
+WORDS = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor".split()
+
+
+@dataclass
+class Festival:
+    acts: list[dict[str, Any]]
+    itinerary: dict[str, dict[str, str]]
+    programme_cache: dict[str, Any]
+    programs: list[dict[str, Any]]
+    locations: list[dict[str, Any]]
+
+
+def make_name(rng: random.Random) -> str:
+    name = " ".join(
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4)))
+        for _ in range(rng.randint(1, 4))
+    ).title()
+    if rng.random() < 0.05:
+        name += " (Vriendenavond)"
+    return name
+
+
+def make_description(rng: random.Random) -> str:
+    """A long HTML description, like those on the website"""
+    html = ""
+    for _ in range(rng.randint(3, 10)):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(40, 120))]
+        words[rng.randrange(len(words))] = f"<strong>{rng.choice(WORDS)}</strong>"
+        words[rng.randrange(len(words))] = f"<a href='https://example.com'>{rng.choice(WORDS)}</a>"
+        html += f"<p>{' '.join(words)}</p>\n"
+    if rng.random() < 0.3:
+        html += "<ul>" + "".join(f"<li>{rng.choice(WORDS)}</li>" for _ in range(5)) + "</ul>\n"
+    return html
+
+
+def make_timeline(rng: random.Random, stage: str, shows: int) -> list[dict[str, Any]]:
+    def event(type: str, start: datetime.datetime, minutes: int, stage: str | None) -> dict:
+        end = start + datetime.timedelta(minutes=minutes)
+        return {
+            "start": start.strftime("%Y-%m-%d %H:%M:%S"),
+            "end": end.strftime("%Y-%m-%d %H:%M:%S"),
+            "type": type,
+            "stage": stage,
+        }
+
+    day = rng.randrange(DAYS)
+    start = FIRST_DAY + datetime.timedelta(days=day, minutes=15 * rng.randrange(40))
+    timeline = [event("Get in", start, 0, None)]
+    if rng.random() < 0.5:
+        timeline.append(event("Dinner", start + datetime.timedelta(minutes=30), 45, None))
+    check = rng.choice(["Soundcheck", "Linecheck"])
+    start += datetime.timedelta(minutes=90)
+    timeline.append(event(check, start, rng.choice([15, 30, 45]), stage))
+    start += datetime.timedelta(minutes=60)
+    for _ in range(shows):
+        length = rng.choice([30, 45, 60, 75, 90])
+        timeline.append(event("Set up", start - datetime.timedelta(minutes=30), 30, stage))
+        timeline.append(event("Showtime", start, length, stage))
+        start += datetime.timedelta(minutes=length + 120)
+    timeline.append(event("Get out", start - datetime.timedelta(minutes=90), 30, stage))
+    return timeline
+
+
+def make_festival(acts: int, seed: int = 42, extra_programs: float = 0.5) -> Festival:
+    """Generates `acts` acts, and `extra_programs` times as many website programs without act"""
+    rng = random.Random(seed)
+    locations = [{"id": i + 1, "title": stage} for i, stage in enumerate(STAGES)]
+    location_ids = {location["title"]: location["id"] for location in locations}
+
+    festival = Festival([], {}, {"schema_version": "3.0", "acts": {}}, [], locations)
+    for i in range(acts):
+        key = f"act{i}"
+        name = make_name(rng)
+        stage = rng.choices(list(STAGES), weights=list(STAGES.values()))[0]
+        shows = rng.choices([1, 2, 3], weights=[85, 12, 3])[0]
+        festival.acts.append(
+            {"id": key, "name": name, "timeline": make_timeline(rng, stage, shows)}
+        )
+        festival.itinerary[key] = {"dressing_room": rng.choice(DRESSING_ROOMS)}
+
+        # the website's titles aren't always exactly the act names
+        title = name.replace(" (Vriendenavond)", "")
+        if rng.random() < 0.1:
+            title = unidecode(title)
+        if rng.random() < 0.1:
+            title = title.upper()
+        description = make_description(rng)
+        festival.programs.append(
+            {
+                "id": len(festival.programs) + 1,
+                "title": title,
+                "description": description,
+                "location": {"id": location_ids[stage]},
+            }
+        )
+        if stage == "Amigo":
+            festival.programme_cache["acts"][key] = {
+                "description_html": description,
+                "description": html_description_to_text(description),
+            }
+
+    for _ in range(int(acts * extra_programs)):
+        festival.programs.append(
+            {
+                "id": len(festival.programs) + 1,
+                "title": make_name(rng),
+                "description": make_description(rng),
+                "location": {"id": rng.choice(locations)["id"]},
+            }
+        )
+    rng.shuffle(festival.programs)
+    return festival
+
+
+def write_instance(festival: Festival, directory: Path):
+    """Writes the files the app keeps in its instance folder"""
+    for name, data in [
+        ("acts", festival.acts),
+        ("itinerary", festival.itinerary),
+        ("programme_cache", festival.programme_cache),
+    ]:
+        with open(directory / f"{name}.json", "w") as f:
+            json.dump(data, f, indent=2)
+
+
+def write_website(festival: Festival, directory: Path):
+    """Writes the website API's responses, as `programs.json` and `locations.json`"""
+    for name, data in [("programs", festival.programs), ("locations", festival.locations)]:
+        with open(directory / f"{name}.json", "w") as f:
+            json.dump(data, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--acts", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    args.directory.mkdir(parents=True, exist_ok=True)
+    festival = make_festival(args.acts, args.seed)
+    write_instance(festival, args.directory)
+    write_website(festival, args.directory)
+    print(f"wrote {args.acts} acts and {len(festival.programs)} programs to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""Simulates a fleet of backstage TVs, calendar subscribers and stage managers against waitress
+
+- TVs load the index page with its static files and the itinerary, and keep an `/events` stream
+  open like `index.js` does: they reconnect as `retry:` says, refetch the itinerary on every
+  itinerary event, and only poll it every minute while they had no contact for two minutes
+- phones poll `/programme.ics`, with varying `reminders` and `days`
+- at every changeover, a burst of dressing room changes is sent, and the changeover lasts until
+  a minute after that
+
+Time runs `--speedup` times faster than in reality, e.g. with 60 a minute takes a second, except
+for the `retry:` the app sends on `/events`, which is real time (streams are held open, by the
+app's event stream server rather than waitress threads). Per route, the latency percentiles (for
+`/events` until the response starts, including the redirect) and throughput are reported, both
+overall and for the requests made during changeovers, and saved as JSON with `--output`.
+
+Run with `python -m benchmark.loadtest --tvs 20 --phones 200`.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import requests
+
+from benchmark.festival_data import make_festival, write_instance
+from src import default_settings
+from test.conftest import TEST_DIR, create_session, start_app_waitress
+
+REMINDERS = ["start_utc.-6;end_utc.-6", "start_utc.-10", "start_utc.-30;end_utc.-5", ""]
+DAYS = ["woensdag", "donderdag", "vrijdag", "zaterdag", "zondag"]
+
+
+@dataclass
+class Recorder:
+    """Collects the latency of every request, per route"""
+
+    changeover: threading.Event = field(default_factory=threading.Event)
+    # route, seconds, whether it was during a changeover, whether it failed
+    samples: list[tuple[str, float, bool, bool]] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def request(
+        self, session: requests.Session, method: str, route: str, url: str, **kwargs
+    ) -> requests.Response | None:
+        """Returns the response, `None` if the request failed
+
+        With `stream=True`, the latency is until the response starts.
+        """
+        during_changeover = self.changeover.is_set()
+        start = time.perf_counter()
+        response = None
+        try:
+            response = session.request(method, url, timeout=30, **kwargs)
+            failed = response.status_code >= 400
+        except requests.RequestException:
+            failed = True
+        seconds = time.perf_counter() - start
+        during_changeover = during_changeover or self.changeover.is_set()
+        with self.lock:
+            self.samples.append((route, seconds, during_changeover, failed))
+        if failed and response is not None:
+            response.close()
+        return None if failed else response
+
+
+def percentile(ordered: list[float], p: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    return ordered[max(0, min(len(ordered) - 1, round(p / 100 * len(ordered)) - 1))]
+
+
+def summarize(samples: list[tuple[str, float, bool, bool]], duration: float) -> dict:
+    summary = {}
+    for period, in_period in [("all", lambda _: True), ("changeover", lambda during: during)]:
+        routes: dict[str, list[tuple[float, bool]]] = {}
+        for route, seconds, during_changeover, failed in samples:
+            if in_period(during_changeover):
+                routes.setdefault(route, []).append((seconds, failed))
+        summary[period] = {}
+        for route, results in sorted(routes.items()):
+            ordered = sorted(seconds for seconds, _ in results)
+            summary[period][route] = {
+                "requests": len(results),
+                "errors": sum(failed for _, failed in results),
+                "per_second": len(results) / duration,
+                "p50_ms": percentile(ordered, 50) * 1000,
+                "p95_ms": percentile(ordered, 95) * 1000,
+                "p99_ms": percentile(ordered, 99) * 1000,
+                "max_ms": ordered[-1] * 1000,
+                "mean_ms": statistics.fmean(ordered) * 1000,
+            }
+    return summary
+
+
+def run(args: argparse.Namespace) -> dict:
+    festival = make_festival(args.acts, args.seed)
+    keys = list(festival.itinerary)
+    stop = threading.Event()
+    recorder = Recorder()
+    minute = 60 / args.speedup
+
+    def tv(rng: random.Random, host: str):
+        session = create_session(host)
+        # not all TVs are switched on at the same moment
+        if stop.wait(rng.uniform(0, minute)):
+            return
+        recorder.request(session, "GET", "/", f"{host}/")
+        for file in ["index.js", "index.css"]:
+            recorder.request(session, "GET", "/static", f"{host}/static/{file}")
+        recorder.request(session, "GET", "/itinerary", f"{host}/itinerary")
+        last_contact = [time.monotonic()]
+        threading.Thread(target=event_source, args=[host, last_contact], daemon=True).start()
+        while not stop.wait(minute):
+            if time.monotonic() - last_contact[0] > 2 * minute:
+                recorder.request(session, "GET", "/itinerary", f"{host}/itinerary")
+
+    def event_source(host: str, last_contact: list[float]):
+        """Like the browser's `EventSource`, with the TV's event handlers"""
+        # sessions aren't thread-safe, and these endpoints don't need a login
+        session = requests.Session()
+        last_id = None
+        retry = 3.0  # until the app says otherwise, like browsers
+        while not stop.is_set():
+            headers = {} if last_id is None else {"Last-Event-ID": last_id}
+            response = recorder.request(
+                session, "GET", "/events", f"{host}/events", headers=headers, stream=True
+            )
+            if response is not None:
+                last_contact[0] = time.monotonic()
+                event = None
+                try:
+                    for line in response.iter_lines(decode_unicode=True):
+                        field, _, value = line.partition(": ")
+                        if field == "retry":
+                            retry = int(value) / 1000
+                        elif field == "id":
+                            last_id = value
+                        elif field == "event":
+                            event = value
+                        elif not line:
+                            if event == "itinerary" and not stop.is_set():
+                                last_contact[0] = time.monotonic()
+                                recorder.request(session, "GET", "/itinerary", f"{host}/itinerary")
+                            event = None
+                except requests.RequestException:
+                    pass
+                response.close()
+            if stop.wait(retry):
+                return
+
+    def phone(rng: random.Random, host: str):
+        session = requests.Session()
+        params = {
+            "reminders": rng.choice(REMINDERS),
+            "days": ";".join(rng.sample(DAYS, rng.randint(1, len(DAYS)))),
+        }
+        if stop.wait(rng.uniform(0, args.phone_interval * minute)):
+            return
+        while True:
+            recorder.request(
+                session, "GET", "/programme.ics", f"{host}/programme.ics", params=params
+            )
+            if stop.wait(args.phone_interval * minute):
+                return
+
+    def stage_manager(rng: random.Random, host: str):
+        session = create_session(host)
+        while not stop.wait(args.changeover_interval * minute):
+            recorder.changeover.set()
+            for _ in range(args.burst):
+                key = rng.choice(keys)
+                url = f"{host}/itinerary/{key}/dressing_room"
+                room = f"Room {rng.randint(1, 20)}".encode("utf-8")
+                recorder.request(session, "PUT", "/itinerary/<act>/dressing_room", url, data=room)
+            # the clients notice the changes in the minute after
+            stop.wait(minute)
+            recorder.changeover.clear()
+
+    with tempfile.TemporaryDirectory() as directory:
+        instance = Path(directory) / "instance"
+        instance.mkdir()
+        write_instance(festival, instance)
+        # the tests hold event streams only briefly
+        settings = Path(directory) / "settings.py"
+        settings.write_text(
+            (TEST_DIR / "settings.py").read_text()
+            + f"EVENTS_HOLD_SECONDS = {default_settings.EVENTS_HOLD_SECONDS}\n"
+        )
+        with start_app_waitress(instance, args.port, args.threads, settings) as host:
+            rng = random.Random(args.seed)
+            clients = [(tv, random.Random(rng.random())) for _ in range(args.tvs)]
+            clients += [(phone, random.Random(rng.random())) for _ in range(args.phones)]
+            clients.append((stage_manager, random.Random(rng.random())))
+            threads = [
+                threading.Thread(target=client, args=[client_rng, host], daemon=True)
+                for client, client_rng in clients
+            ]
+            for thread in threads:
+                thread.start()
+            time.sleep(args.duration)
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    return {
+        "settings": vars(args) | {"output": str(args.output)},
+        "results": summarize(recorder.samples, args.duration),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--tvs", type=int, default=20)
+    parser.add_argument("--phones", type=int, default=100)
+    parser.add_argument("--phone-interval", type=float, default=15, help="in (scaled) minutes")
+    parser.add_argument("--changeover-interval", type=float, default=5, help="in (scaled) minutes")
+    parser.add_argument("--burst", type=int, default=20, help="dressing room changes per burst")
+    parser.add_argument("--speedup", type=float, default=60)
+    parser.add_argument("--duration", type=float, default=30, help="in (real) seconds")
+    parser.add_argument("--acts", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--threads", type=int, default=8, help="of waitress")
+    parser.add_argument("--port", type=int, default=5003)
+    parser.add_argument("--output", type=Path, help="file to save the results to")
+    args = parser.parse_args()
+
+    report = run(args)
+    for period, routes in report["results"].items():
+        print(f"{period}:")
+        for route, result in routes.items():
+            print(
+                f"  {route:32} {result['requests']:6} requests {result['errors']:4} errors "
+                f"{result['per_second']:7.1f}/s  p50 {result['p50_ms']:7.1f}  "
+                f"p95 {result['p95_ms']:7.1f}  p99 {result['p99_ms']:7.1f}  "
+                f"max {result['max_ms']:7.1f} ms"
+            )
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Times the expensive operations on synthetic festival data of several sizes
+
+Per operation and size, the fastest and median time and the peak memory allocated are reported.
+The results are saved as JSON, to compare two commits:
+
+    python -m benchmark.suite --output before.json
+    git switch other-branch
+    python -m benchmark.suite --output after.json
+    python -m benchmark.suite --compare before.json after.json
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import logging
+import platform
+import statistics
+import tempfile
+import timeit
+import tracemalloc
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Callable
+
+import responses
+
+from app import create_app, get_version
+from src.storage import CachedStorage
+from zpfwebsite import ProgramMatcher, find_best_matching_program
+from benchmark.festival_data import Festival, make_festival, write_instance
+
+ACTS_URL = "https://planner.fake/acts"
+
+SETTINGS = f"""
+USERNAME = "benchmark"
+PASSWORD = "benchmark"
+UPDATE_PROGRAMME = False
+ZPF_API_URL = ""
+ACTS_URL = {ACTS_URL!r}
+ACTS_USERNAME = "benchmark"
+ACTS_PASSWORD = "benchmark"
+WTF_CSRF_ENABLED = False
+"""
+
+# titles matched one by one with `find_best_matching_program`, which isn't meant for many
+SINGLE_MATCHES = 20
+
+
+def measure(operation: Callable[[], object], repeat: int) -> dict[str, float]:
+    operation()  # warm up, e.g. caches which are built once and not per change
+    times = timeit.repeat(operation, number=1, repeat=repeat)
+    tracemalloc.start()
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "min_ms": min(times) * 1000,
+        "median_ms": statistics.median(times) * 1000,
+        "peak_kib": peak / 1024,
+    }
+
+
+def make_operations(
+    festival: Festival, directory: Path, stack: ExitStack
+) -> dict[str, Callable[[], object]]:
+    """The operations to time, through the app's endpoints and jobs like in production"""
+    instance = directory / "instance"
+    instance.mkdir()
+    write_instance(festival, instance)
+    (directory / "settings.py").write_text(SETTINGS)
+    app = create_app(instance_path=instance, config_filename=directory / "settings.py")
+    update_acts = app.extensions["ingest_jobs"]["update_acts"]
+    client = app.test_client()
+    login = {"username": "benchmark", "password": "benchmark", "submit": "Submit"}
+    assert client.post("/login", data=login).status_code == 302
+    counter = itertools.count()
+
+    # the production planner's feed, in which an Amigo act gets a new name on every fetch
+    renamed = next(
+        act for act in festival.acts if any(e["stage"] == "Amigo" for e in act["timeline"])
+    )
+    acts_body = json.dumps(
+        [act | {"name": "{name}"} if act is renamed else act for act in festival.acts]
+    )
+    planner = responses.RequestsMock()
+    planner.add_callback(
+        "GET",
+        ACTS_URL,
+        lambda _: (200, {}, acts_body.replace("{name}", f"Act {next(counter)}")),
+        content_type="application/json",
+    )
+    planner.start()
+    stack.callback(planner.stop)
+
+    keys = list(festival.itinerary)
+
+    def change_dressing_room():
+        key = keys[next(counter) % len(keys)]
+        response = client.put(f"/itinerary/{key}/dressing_room", data=f"Room {next(counter)}")
+        assert response.status_code == 200
+        # rebuilt on the first request after the change
+        assert client.get("/itinerary").status_code == 200
+
+    def serve_ical():
+        # a new URL every time, otherwise only the first request renders
+        url = f"/programme.ics?reminders=start_utc.-{next(counter)};end_utc.-5"
+        assert client.get(url).status_code == 200
+
+    amigo_names = [
+        act["name"]
+        for act in festival.acts
+        if any(event["stage"] == "Amigo" for event in act["timeline"])
+    ]
+    single_names = amigo_names[:SINGLE_MATCHES]
+
+    def find_best_matching_programs():
+        for name in single_names:
+            try:
+                find_best_matching_program(festival.programs, name)
+            except ValueError:
+                pass
+
+    def match_all():
+        ProgramMatcher(festival.programs).match_all(amigo_names)
+
+    storage = CachedStorage([], directory / "acts.json")
+    with storage.lock() as acts:
+        acts[:] = festival.acts
+
+    def save():
+        # change something, otherwise nothing is written
+        with storage.lock() as acts:
+            acts[0]["name"] = f"Act {next(counter)}"
+            storage.save()
+
+    return {
+        # fetches the acts, saves them and rebuilds the Amigo programme
+        "update_acts (an Amigo act renamed)": update_acts,
+        "PUT dressing room + GET /itinerary": change_dressing_room,
+        "GET /programme.ics (new parameters)": serve_ical,
+        f"find_best_matching_program ({len(single_names)} acts)": find_best_matching_programs,
+        "ProgramMatcher.match_all (Amigo acts)": match_all,
+        "CachedStorage.save (acts)": save,
+    }
+
+
+def run(sizes: list[int], repeat: int, seed: int) -> dict:
+    results = {}
+    for size in sizes:
+        festival = make_festival(size, seed)
+        results[str(size)] = {}
+        with tempfile.TemporaryDirectory() as directory, ExitStack() as stack:
+            for name, operation in make_operations(festival, Path(directory), stack).items():
+                results[str(size)][name] = result = measure(operation, repeat)
+                print(
+                    f"{size:6} acts  {name:42} {result['min_ms']:9.2f} ms (median "
+                    f"{result['median_ms']:9.2f} ms) {result['peak_kib']:9.0f} KiB peak"
+                )
+    return {
+        "version": get_version(),
+        "python": platform.python_version(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "seed": seed,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(before: dict, after: dict):
+    print(f"before: {before['version']} ({before['date']})")
+    print(f"after:  {after['version']} ({after['date']})")
+    for size, operations in after["results"].items():
+        for name, result in operations.items():
+            old = before["results"].get(size, {}).get(name)
+            if old is None:
+                continue
+            ratio = result["median_ms"] / old["median_ms"]
+            memory_ratio = result["peak_kib"] / old["peak_kib"] if old["peak_kib"] else 1
+            print(
+                f"{size:>6} acts  {name:42} {old['median_ms']:9.2f} -> {result['median_ms']:9.2f} "
+                f"ms ({ratio:5.2f}x)  memory {memory_ratio:5.2f}x"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sizes", default="50,1000,5000", help="numbers of acts, e.g. 50,20000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="file to save the results to")
+    parser.add_argument("--compare", type=Path, nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        before, after = (json.loads(path.read_text()) for path in args.compare)
+        compare(before, after)
+        return
+
+    # the app logs every change, which would drown the results
+    logging.disable(logging.INFO)
+    results = run([int(size) for size in args.sizes.split(",")], args.repeat, args.seed)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Compressed response bodies, compressed once per version of the data"""
+
+import gzip
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+from flask import Response
+from werkzeug.datastructures import Accept
+
+try:
+    import brotli
+except ImportError:
+    # optional, only gzip is offered without it
+    brotli = None
+
+# in order of preference
+COMPRESSORS: dict[str, Callable[[bytes], bytes]] = {}
+if brotli is not None:
+    COMPRESSORS["br"] = lambda body: brotli.compress(body, quality=11)
+# mtime=0 makes the output deterministic
+COMPRESSORS["gzip"] = lambda body: gzip.compress(body, compresslevel=9, mtime=0)
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/javascript",
+    "image/svg+xml",
+}
+
+
+def is_compressible(mimetype: str | None) -> bool:
+    """Whether compressing content of this type is worth it (images e.g. already are compressed)"""
+    return mimetype is not None and (
+        mimetype.startswith("text/") or mimetype in COMPRESSIBLE_MIMETYPES
+    )
+
+
+def choose_encoding(accept_encodings: Accept) -> str | None:
+    """The best content coding the client accepts, `None` for none (i.e. "identity")"""
+    return accept_encodings.best_match(list(COMPRESSORS))
+
+
+class CompressionCache:
+    """Compressed bodies per key (e.g. a URL) and content coding, for one version per key
+
+    A body is only compressed once per version of the data, e.g. its ETag, which is the expensive
+    part. Only the latest version per key is kept, and at most `max_entries` keys and codings, the
+    least recently used are dropped.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        # version and compressed body, per key and coding
+        self._entries: OrderedDict[tuple[Hashable, str], tuple[Hashable, bytes | None]] = (
+            OrderedDict()
+        )
+
+    def get(
+        self, key: Hashable, version: Hashable, encoding: str, body: Callable[[], bytes]
+    ) -> bytes | None:
+        """Returns what `body()` returns compressed with `encoding`, `None` if that's no smaller
+
+        `body` is only called if this version isn't compressed yet.
+        """
+        entry_key = (key, encoding)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(entry_key)
+                return entry[1]
+
+        # compress without holding the lock, so other bodies can be served in the meantime
+        data = body()
+        compressed: bytes | None = COMPRESSORS[encoding](data)
+        if len(compressed) >= len(data):
+            compressed = None
+        with self._lock:
+            self._entries[entry_key] = (version, compressed)
+            self._entries.move_to_end(entry_key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return compressed
+
+    def compress_response(
+        self,
+        response: Response,
+        key: Hashable,
+        version: Hashable,
+        encoding: str,
+        body: Callable[[], bytes] | None = None,
+    ):
+        """Replaces the body of `response` by its compressed version, if that's smaller
+
+        The body is taken from the response, unless `body` is given (needed for streamed
+        responses, like those of static files).
+        """
+        compressed = self.get(key, version, encoding, body or response.get_data)
+        if compressed is None:
+            return
+        response.close()
+        response.direct_passthrough = False
+        response.set_data(compressed)
+        response.content_encoding = encoding
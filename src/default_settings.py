@@ -5,3 +5,43 @@ UPDATE_PROGRAMME = True
 ENABLE_DYNAMIC_TEST_ACT = False
 SENTRY_DSN = None
 SENTRY_ENV = "dev"
+# for how long responses of the festival website are used without revalidating them
+WEBSITE_CACHE_SECONDS = 30 * 60
+# requests to the production planner and the website: timeouts (seconds), number of retries on
+# connection errors and temporary server errors, and after how many consecutive failures a host is
+# not tried for a while
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_READ_TIMEOUT = 30
+HTTP_RETRIES = 2
+HTTP_CIRCUIT_FAILURES = 5
+HTTP_CIRCUIT_COOLDOWN_SECONDS = 60
+# /events redirects to a server of its own for the event streams, on this address (the port must
+# be reachable for the clients, e.g. be published as well with Docker; several processes can
+# share it; 0 means any free port), or to EVENTS_URL if that is set, e.g. when a proxy forwards it
+EVENTS_HOST = "0.0.0.0"
+EVENTS_PORT = 8081
+EVENTS_URL = None
+# after which time clients reconnect to /events, how often a comment is sent on idle streams (to
+# notice clients which are gone), and after how long streams are closed (None for never)
+EVENTS_RETRY_SECONDS = 15
+EVENTS_KEEPALIVE_SECONDS = 25
+EVENTS_HOLD_SECONDS = None
+# number of rendered iCalendar feeds (distinct parameter combinations) to keep
+ICAL_CACHE_SIZE = 32
+# number of compressed response bodies (per URL and content coding) to keep
+COMPRESSION_CACHE_SIZE = 64
+# storage backend per store ("acts", "itinerary", "programme_cache"), "json" if not specified:
+# - "json": rewrite the JSON file on every change
+# - "journal": like "json", but single item updates (e.g. dressing rooms) are appended to a
+#   journal, which is compacted into the JSON file once it exceeds JOURNAL_COMPACT_BYTES
+# - "sqlite": one row per item in SQLITE_DATABASE (in the instance folder), so only changed
+#   items are written; existing data is migrated from the JSON file on first use
+STORAGE_BACKENDS = {}
+JOURNAL_COMPACT_BYTES = 64 * 1024
+SQLITE_DATABASE = "storage.sqlite3"
+# set when several processes serve the same instance folder (e.g. several waitress processes
+# behind a proxy): one of them runs the ingest jobs, storage changes are made under an
+# inter-process lock, and each process checks every MULTI_PROCESS_CHECK_SECONDS whether the
+# others changed anything; only the "json" storage backend supports this
+MULTI_PROCESS = False
+MULTI_PROCESS_CHECK_SECONDS = 1
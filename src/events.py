@@ -0,0 +1,73 @@
+"""Change notices for clients, in the form of Server-Sent Events"""
+
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    type: str
+    data: dict[str, Any]
+
+    def to_sse(self) -> str:
+        """Formats the event for an event stream"""
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data)}\n\n"
+
+
+class EventBroadcaster:
+    """Distributes change notices to any number of clients
+
+    Every event gets a new, increasing ID. A bounded history is kept, so clients which reconnect
+    can catch up on what they missed, as long as they weren't away for too long. IDs start at the
+    current time in milliseconds, so they keep increasing when the process restarts and clients
+    from before the restart are detected.
+    """
+
+    def __init__(self, history_size: int = 1000):
+        self._condition = threading.Condition()
+        self._history: deque[Event] = deque(maxlen=history_size)
+        self._last_id = int(time.time() * 1000)
+        self._subscribers: list[Callable[[], None]] = []
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    def subscribe(self, callback: Callable[[], None]):
+        """Calls `callback` after every publish, from the publishing thread, so it must be quick"""
+        with self._condition:
+            self._subscribers.append(callback)
+
+    def publish(self, type: str, **data) -> Event:
+        with self._condition:
+            self._last_id += 1
+            event = Event(self._last_id, type, data)
+            self._history.append(event)
+            self._condition.notify_all()
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback()
+        return event
+
+    def events_since(self, last_id: int) -> list[Event] | None:
+        """Returns the events after `last_id`, or `None` if those are not all in the history"""
+        with self._condition:
+            return self._events_since(last_id)
+
+    def wait(self, last_id: int, timeout: float) -> list[Event] | None:
+        """Like `events_since`, but waits up to `timeout` seconds for events if there are none"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._last_id != last_id, timeout)
+            return self._events_since(last_id)
+
+    def _events_since(self, last_id: int) -> list[Event] | None:
+        if last_id == self._last_id:
+            return []
+        if last_id > self._last_id or not self._history or self._history[0].id > last_id + 1:
+            return None
+        return [event for event in self._history if event.id > last_id]
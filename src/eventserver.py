@@ -0,0 +1,172 @@
+"""Serves event streams (Server-Sent Events) without a thread per client
+
+Under waitress, every open response occupies a worker thread, so the streams, which are open for
+as long as the clients are there, are served by this small asyncio server on its own port instead.
+It only understands `GET /events` (and the CORS preflight for it), the app redirects clients to it.
+"""
+
+import asyncio
+import logging
+import socket
+import threading
+from urllib.parse import urlsplit
+
+from .events import EventBroadcaster
+
+_logger = logging.getLogger(__name__)
+
+# how long a client may take to send its request
+REQUEST_TIMEOUT_SECONDS = 10
+# clients are on another origin, i.e. the app's port; the events aren't secret
+CORS_HEADERS = (
+    "Access-Control-Allow-Origin: *\r\n"
+    "Access-Control-Allow-Headers: Last-Event-ID, Cache-Control\r\n"
+    "Access-Control-Max-Age: 86400\r\n"
+)
+
+
+class EventStreamServer:
+    """Streams the events of `broadcaster` to any number of clients, from one thread
+
+    Clients get the events after the one in their `Last-Event-ID` header (or only new ones), and a
+    `reset` event if those aren't known anymore. Streams are closed after `hold_seconds` (`None`
+    for never), after which clients reconnect after `retry_seconds`. A comment is sent every
+    `keepalive_seconds`, so connections of clients which are gone are noticed, and proxies don't
+    close idle ones.
+    """
+
+    def __init__(
+        self,
+        broadcaster: EventBroadcaster,
+        host: str,
+        port: int,
+        retry_seconds: float,
+        keepalive_seconds: float,
+        hold_seconds: float | None = None,
+    ):
+        self._broadcaster = broadcaster
+        self._address = (host, port)
+        self._retry_ms = int(retry_seconds * 1000)
+        self._keepalive_seconds = keepalive_seconds
+        self._hold_seconds = hold_seconds
+        # replaced on every publish, after setting it, to wake up all streams
+        self._published = asyncio.Event()
+        self.port: int | None = None
+        self.clients = 0
+
+    def start(self):
+        """Binds the port (so `port` is known afterwards) and serves in a daemon thread"""
+        # several processes (see `MULTI_PROCESS`) can share a fixed port
+        reuse_port = self._address[1] != 0 and hasattr(socket, "SO_REUSEPORT")
+        sock = socket.create_server(self._address, reuse_port=reuse_port)
+        self.port = sock.getsockname()[1]
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        async def serve():
+            server = await asyncio.start_server(self._handle, sock=sock)
+            ready.set()
+            async with server:
+                await server.serve_forever()
+
+        thread = threading.Thread(
+            name="event_streams", target=loop.run_until_complete, args=[serve()], daemon=True
+        )
+        thread.start()
+        ready.wait()
+        self._broadcaster.subscribe(lambda: loop.call_soon_threadsafe(self._wake))
+        _logger.info(f"serving event streams on port {self.port}")
+
+    def _wake(self):
+        published, self._published = self._published, asyncio.Event()
+        published.set()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.clients += 1
+        try:
+            await self._serve_client(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        except asyncio.TimeoutError:
+            _logger.debug("client didn't send a request in time")
+        finally:
+            self.clients -= 1
+            writer.close()
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), REQUEST_TIMEOUT_SECONDS)
+        request_line, *header_lines = head.decode("latin-1").split("\r\n")
+        method, target, _ = (request_line.split(" ") + ["", ""])[:3]
+        headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if urlsplit(target).path != "/events":
+            return await self._respond(writer, "404 Not Found", "not found")
+        if method == "OPTIONS":
+            return await self._respond(writer, "204 No Content", "")
+        if method != "GET":
+            return await self._respond(writer, "405 Method Not Allowed", "only GET")
+        try:
+            last_id = int(headers.get("last-event-id", self._broadcaster.last_id))
+        except ValueError:
+            return await self._respond(writer, "400 Bad Request", "Invalid Last-Event-ID")
+
+        writer.write(
+            (
+                "HTTP/1.1 200 OK\r\n"
+                "Content-Type: text/event-stream; charset=utf-8\r\n"
+                "Cache-Control: no-cache\r\n"
+                "X-Accel-Buffering: no\r\n"
+                f"{CORS_HEADERS}"
+                "Connection: close\r\n\r\n"
+                # make sure the client reconnects with the right ID, even if nothing happens
+                f"retry: {self._retry_ms}\nid: {last_id}\n\n"
+            ).encode("utf-8")
+        )
+        await writer.drain()
+
+        loop = asyncio.get_running_loop()
+        deadline = None if self._hold_seconds is None else loop.time() + self._hold_seconds
+        while True:
+            # taken before looking for events, so none published in between is missed
+            published = self._published
+            new_events = self._broadcaster.events_since(last_id)
+            if new_events is None:
+                writer.write(
+                    f"id: {self._broadcaster.last_id}\nevent: reset\ndata: {{}}\n\n".encode()
+                )
+                await writer.drain()
+                return
+            for event in new_events:
+                writer.write(event.to_sse().encode("utf-8"))
+                last_id = event.id
+            if new_events:
+                await writer.drain()
+
+            timeout = self._keepalive_seconds
+            if deadline is not None:
+                timeout = min(timeout, deadline - loop.time())
+                if timeout <= 0:
+                    return
+            try:
+                await asyncio.wait_for(published.wait(), timeout)
+            except asyncio.TimeoutError:
+                if deadline is None or loop.time() < deadline:
+                    writer.write(b": keepalive\n\n")
+                    await writer.drain()
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: str, body: str):
+        data = body.encode("utf-8")
+        writer.write(
+            (
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"{CORS_HEADERS}"
+                "Connection: close\r\n\r\n"
+            ).encode("latin-1")
+            + data
+        )
+        await writer.drain()
@@ -0,0 +1,118 @@
+"""Shared HTTP client for fetching data from upstream services"""
+
+import logging
+import threading
+import time
+from typing import Callable
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of sending a request to a host which failed too often recently"""
+
+
+class CircuitBreaker:
+    """Stops requests to a host after `threshold` consecutive failures, for `cooldown` seconds
+
+    After the cooldown, requests are let through again. The first failure after that opens the
+    circuit again right away, a success closes it.
+    """
+
+    def __init__(
+        self, threshold: int = 5, cooldown: float = 60, clock: Callable[[], float] = time.monotonic
+    ):
+        self._threshold = threshold
+        self._cooldown = cooldown
+        self._clock = clock
+        self._lock = threading.Lock()
+        # consecutive failures and the time the circuit opened, per host
+        self._failures: dict[str, int] = {}
+        self._opened_at: dict[str, float] = {}
+
+    def check(self, host: str):
+        """Raises `CircuitOpenError` if requests to `host` must not be sent"""
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is not None and self._clock() - opened_at < self._cooldown:
+                raise CircuitOpenError(f"too many failures of {host}, not trying for a while")
+
+    def success(self, host: str):
+        with self._lock:
+            self._failures.pop(host, None)
+            self._opened_at.pop(host, None)
+
+    def failure(self, host: str):
+        with self._lock:
+            self._failures[host] = failures = self._failures.get(host, 0) + 1
+            if failures >= self._threshold:
+                if host not in self._opened_at:
+                    _logger.error(f"{failures} consecutive failures of {host}, opening circuit")
+                self._opened_at[host] = self._clock()
+
+
+class _Adapter(HTTPAdapter):
+    """Adds a default timeout and the circuit breaker to the standard adapter"""
+
+    def __init__(self, timeout: tuple[float, float], breaker: CircuitBreaker, **kwargs):
+        self._timeout = timeout
+        self._breaker = breaker
+        super().__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        host = urlsplit(request.url).netloc
+        self._breaker.check(host)
+        try:
+            response = super().send(
+                request, timeout=self._timeout if timeout is None else timeout, **kwargs
+            )
+        except requests.RequestException:
+            self._breaker.failure(host)
+            raise
+        if response.status_code >= 500:
+            self._breaker.failure(host)
+        else:
+            self._breaker.success(host)
+        return response
+
+
+def create_session(
+    connect_timeout: float = 5,
+    read_timeout: float = 30,
+    retries: int = 2,
+    backoff: float = 1,
+    breaker: CircuitBreaker | None = None,
+    pool_size: int = 10,
+) -> requests.Session:
+    """Creates a session which pools connections, and which by default:
+
+    - times out when connecting or reading takes too long
+    - retries idempotent requests a limited number of times on connection errors and temporary
+      server errors, waiting `backoff`, 2 * `backoff`, ... seconds in between
+    - doesn't send requests to hosts which keep failing, see `CircuitBreaker`
+
+    The session is thread-safe as long as it's not modified, so don't set e.g. `auth` on it, but
+    pass it per request.
+    """
+    session = requests.Session()
+    adapter = _Adapter(
+        (connect_timeout, read_timeout),
+        breaker or CircuitBreaker(),
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False,
+        ),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
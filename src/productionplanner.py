@@ -1,6 +1,15 @@
 """Functions related to handling data from the production planner"""
 
+import bisect
+import datetime
 import re
+import sys
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+# the production planner gives local times, without offset
+FESTIVAL_TIMEZONE = datetime.timezone(datetime.timedelta(hours=2))
 
 
 def remove_friends_night_tag(act_name: str):
@@ -8,3 +17,217 @@ def remove_friends_night_tag(act_name: str):
     return re.sub(
         r" *[@[\(] *vr(ienden)* *(avond)*[]\)]*$", "", act_name, count=1, flags=re.IGNORECASE
     )
+
+
+@dataclass(frozen=True)
+class ActsDiff:
+    """Changes between two versions of the acts list, per act key (`str(act["id"])`)"""
+
+    added: dict[str, dict[str, Any]] = field(default_factory=dict)
+    removed: dict[str, dict[str, Any]] = field(default_factory=dict)
+    # old and new version
+    modified: dict[str, tuple[dict[str, Any], dict[str, Any]]] = field(default_factory=dict)
+    # keys of the modified acts of which the timeline changed
+    rescheduled: set[str] = field(default_factory=set)
+    # whether acts which are in both versions are in a different order
+    reordered: bool = False
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.modified or self.reordered)
+
+    def keys(self) -> set[str]:
+        """Keys of all added, removed and modified acts"""
+        return self.added.keys() | self.removed.keys() | self.modified.keys()
+
+    def acts(self) -> Iterator[dict[str, Any]]:
+        """All versions of the changed acts, i.e. both old and new version of modified acts"""
+        yield from self.added.values()
+        yield from self.removed.values()
+        for old, new in self.modified.values():
+            yield old
+            yield new
+
+    def summary(self) -> dict[str, list[str]]:
+        """The changed keys, in a JSON-serializable form"""
+        return {
+            "added": sorted(self.added),
+            "removed": sorted(self.removed),
+            "modified": sorted(self.modified),
+            "rescheduled": sorted(self.rescheduled),
+        }
+
+
+def diff_acts(old: list[dict[str, Any]], new: list[dict[str, Any]]) -> ActsDiff:
+    """Compares two versions of the acts list, by act ID"""
+    if old == new:
+        return ActsDiff()
+
+    old_by_key = {str(act["id"]): act for act in old}
+    new_by_key = {str(act["id"]): act for act in new}
+    modified = {
+        key: (old_by_key[key], act)
+        for key, act in new_by_key.items()
+        if key in old_by_key and old_by_key[key] != act
+    }
+    return ActsDiff(
+        added={key: act for key, act in new_by_key.items() if key not in old_by_key},
+        removed={key: act for key, act in old_by_key.items() if key not in new_by_key},
+        modified=modified,
+        rescheduled={
+            key
+            for key, (old_act, act) in modified.items()
+            if old_act["timeline"] != act["timeline"]
+        },
+        reordered=[key for key in old_by_key if key in new_by_key]
+        != [key for key in new_by_key if key in old_by_key],
+    )
+
+
+def parse_datetime(datestr: str) -> datetime.datetime:
+    """Parses a time of the production planner, like "2025-08-09 21:30:00\" """
+    return datetime.datetime.fromisoformat(datestr).replace(tzinfo=FESTIVAL_TIMEZONE)
+
+
+def festival_weekday(timepoint: datetime.datetime):
+    """Returns the `datetime` day of week for a timepoint, assuming 06:00 for start of new day"""
+    return (timepoint - datetime.timedelta(hours=6)).weekday()
+
+
+class TimelineEvent:
+    """One event of an act's timeline, with everything derived from it computed once"""
+
+    __slots__ = (
+        "type",
+        "stage",
+        "legacy_stage",
+        "start_utc",
+        "end_utc",
+        "legacy_start",
+        "legacy_end",
+        "day",
+    )
+
+    def __init__(self, event: dict[str, Any]):
+        # the strings repeat a lot, so share them
+        self.type: str = sys.intern(event["type"])
+        self.stage: str | None = _intern_optional(event["stage"])
+        self.legacy_stage = _intern_optional(self.stage.upper() if self.stage is not None else None)
+        start = parse_datetime(event["start"])
+        self.start_utc = int(start.timestamp())
+        self.end_utc = int(parse_datetime(event["end"]).timestamp())
+        # "HH:MM", local time
+        self.legacy_start = sys.intern(event["start"][11:16])
+        self.legacy_end = sys.intern(event["end"][11:16])
+        # day of week the event belongs to, see `festival_weekday`
+        self.day = festival_weekday(start)
+
+
+class Act:
+    """An act of the production planner, parsed"""
+
+    __slots__ = ("key", "name", "timeline", "shows", "stages")
+
+    def __init__(self, act: dict[str, Any]):
+        self.key = str(act["id"])
+        self.name: str = act["name"]
+        self.timeline = tuple(TimelineEvent(event) for event in act["timeline"])
+        self.shows = tuple(event for event in self.timeline if event.type == "Showtime")
+        # of all events, as given by the production planner
+        stages = frozenset(event.stage for event in self.timeline)
+        self.stages = _stage_sets.setdefault(stages, stages)
+
+
+def _intern_optional(string: str | None) -> str | None:
+    return sys.intern(string) if string is not None else None
+
+
+# to share equal sets of stages between acts
+_stage_sets: dict[frozenset[str | None], frozenset[str | None]] = {}
+
+
+class ShowIndex:
+    """Shows of parsed acts, by (legacy) stage and festival day, each sorted by start time"""
+
+    def __init__(self, acts: list[Act]):
+        shows = sorted(
+            ((act, show) for act in acts for show in act.shows), key=lambda item: item[1].start_utc
+        )
+        self._slices: dict[tuple[str | None, int | None], list[tuple[Act, TimelineEvent]]] = {}
+        for act, show in shows:
+            for key in [
+                (None, None),
+                (show.legacy_stage, None),
+                (None, show.day),
+                (show.legacy_stage, show.day),
+            ]:
+                self._slices.setdefault(key, []).append((act, show))
+        self._starts = {
+            key: [show.start_utc for _, show in items] for key, items in self._slices.items()
+        }
+
+    def shows(
+        self,
+        stage: str | None = None,
+        day: int | None = None,
+        start_from: int | None = None,
+        start_before: int | None = None,
+    ) -> list[tuple[Act, TimelineEvent]]:
+        """Returns the shows (with their act) on `stage` and/or on festival `day`
+
+        The shows can be limited to those starting within [`start_from`, `start_before`), in UTC
+        timestamps. The shows are sorted by start time. Takes time proportional to the result.
+        """
+        key = (stage, day)
+        items = self._slices.get(key, [])
+        low = 0 if start_from is None else bisect.bisect_left(self._starts[key], start_from)
+        high = (
+            len(items)
+            if start_before is None
+            else bisect.bisect_left(self._starts[key], start_before)
+        )
+        return items[low:high]
+
+
+class ParsedActs:
+    """Keeps the parsed version of the latest acts
+
+    Only acts which changed since the previous version are parsed again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation: int | None = None
+        self._acts: list[Act] = []
+        self._index: ShowIndex | None = None
+        # raw and parsed act, by key
+        self._parsed: dict[str, tuple[dict[str, Any], Act]] = {}
+
+    def get(self, acts: list[dict[str, Any]], generation: int) -> list[Act]:
+        """Returns the parsed `acts`, which have the given storage generation"""
+        with self._lock:
+            if generation == self._generation:
+                return self._acts
+            parsed = {}
+            self._acts = []
+            for raw in acts:
+                key = str(raw["id"])
+                previous = self._parsed.get(key)
+                if previous is None or previous[0] != raw:
+                    previous = (raw, Act(raw))
+                parsed[key] = previous
+                self._acts.append(previous[1])
+            self._parsed = parsed
+            self._generation = generation
+            self._index = None
+            return self._acts
+
+    def index(self, acts: list[dict[str, Any]], generation: int) -> ShowIndex:
+        """Returns the index of the shows of `acts`, see `get()`"""
+        parsed = self.get(acts, generation)
+        with self._lock:
+            if self._index is None or self._generation != generation:
+                index = ShowIndex(parsed)
+                if self._generation == generation:
+                    self._index = index
+                return index
+            return self._index
@@ -1,10 +1,20 @@
+import copy
 import threading
+import hashlib
+import itertools
+import os
+import sqlite3
+import time
+from contextlib import contextmanager, ExitStack
 from pathlib import Path
-from typing import IO, Callable, Any, ContextManager
+from typing import IO, Callable, Any, ContextManager, Iterator, Sequence
 import json
 import logging
+from dataclasses import dataclass
 from functools import partial
 
+import filelock
+
 _logger = logging.getLogger(__name__)
 
 
@@ -23,6 +33,38 @@ class ThreadSafeObjectContextManager[T]:
 
 OpenType = Callable[[str, str], IO[Any]]
 
+# gives all storages a fixed order, in which they're locked by `Transaction`
+_storage_counter = itertools.count()
+
+# Publishing new snapshots is bracketed by increments of this sequence (so it is odd while
+# publishing), which lets `snapshots()` detect it read in the middle of publishing.
+_publish_lock = threading.Lock()
+_publish_sequence = 0
+
+# upper bound of how coarse file modification times are, see `SharedStorage._settled()`
+_MTIME_GRANULARITY_NS = 1_000_000_000
+
+
+@contextmanager
+def _publishing():
+    global _publish_sequence
+    with _publish_lock:
+        _publish_sequence += 1
+        try:
+            yield
+        finally:
+            _publish_sequence += 1
+
+
+@dataclass(frozen=True)
+class Snapshot[T]:
+    """Copy of the data as it was persisted by a certain generation, must not be modified"""
+
+    data: T
+    generation: int
+    # of the persisted contents, if they are exactly `data`
+    digest: bytes | None = None
+
 
 class CachedStorage[DataType: (dict, list), SerializedType]:
     def __init__(
@@ -38,53 +80,621 @@ class CachedStorage[DataType: (dict, list), SerializedType]:
     ):
         self.opener = opener
         self.serializer = serializer
+        self.deserializer = deserializer
         self.binary = binary
         self._file = file
+        self._order = next(_storage_counter)
+        # digest of what's on disk, to detect changes without reading the file back
+        self._digest: bytes | None = None
 
         self._object = default.copy()
-        need_save = True
+        self._snapshot = Snapshot(copy.deepcopy(self._object), 0)
+        need_save = not self._load(validator, ignore_init_errors)
+
+        self._lock = threading.RLock()
+        self._manager = ThreadSafeObjectContextManager(object=self._object, lock=self._lock)
+
+        if self._load_changes() or need_save:
+            self.save()
+
+    def _load(
+        self, validator: Callable[[DataType], bool], ignore_init_errors: list[type[Exception]]
+    ) -> bool:
+        """Loads the persisted data, returns whether there was valid data"""
+        file = self._file
         try:
-            with opener(str(file), f"r{'b' if binary else ''}") as f:
-                temp_object = deserializer(f.read())
+            with self.opener(str(file), f"r{'b' if self.binary else ''}") as f:
+                contents = f.read()
+            temp_object = self.deserializer(contents)
             if validator(temp_object):
                 self._object = temp_object
-                need_save = False
-            else:
-                _logger.error(f"data validation failed for {file}, using default value")
-            _logger.debug(f"loaded {file}")
+                self._digest = digest(contents)
+                self._snapshot = Snapshot(self.deserializer(contents), 0, self._digest)
+                _logger.debug(f"loaded {file}")
+                return True
+            _logger.error(f"data validation failed for {file}, using default value")
         except FileNotFoundError:
             _logger.info(f"{file} not existing, using default value")
         except Exception as e:
             if type(e) not in ignore_init_errors:
                 raise
             _logger.error(f"error deserializing existing data: {e}, using default value")
+        return False
 
-        self._manager = ThreadSafeObjectContextManager(object=self._object, lock=threading.RLock())
-
-        if need_save:
-            self.save()
+    def _load_changes(self) -> bool:
+        """Hook to apply changes persisted elsewhere after loading, returns if there were any"""
+        return False
 
     def lock(self) -> ContextManager[DataType]:
         return self._manager
 
-    def save(self):
+    def snapshot(self) -> Snapshot[DataType]:
+        """Returns the data as last persisted by `save()`, without locking
+
+        Snapshots are never modified, but replaced by a new one on every effective save. This
+        allows any number of readers to work concurrently with each other and with a writer.
+        """
+        return self._snapshot
+
+    @property
+    def generation(self) -> int:
+        """Number which increases every time `save()` changes the persisted contents"""
+        return self._snapshot.generation
+
+    def set_item(self, path: Sequence, value) -> bool:
+        """Sets one item, addressed by a path of keys and/or indices, and persists the data
+
+        Raises `KeyError` or `IndexError` if the item's parent doesn't exist. Returns whether the
+        persisted contents changed.
+        """
+        with self._manager:
+            _get_parent(self._object, path)[path[-1]] = value
+            return self.save()
+
+    def save(self) -> bool:
+        """Persists the data, returns whether the persisted contents changed"""
         # we use an RLock so this should be fine both outside and inside of the lock
         with self._manager:
-            write_if_needed(
-                self._file, self.serializer(self._object), opener=self.opener, binary=self.binary
+            snapshot = self._write()
+            if snapshot is None:
+                return False
+            with _publishing():
+                self._snapshot = snapshot
+            return True
+
+    def _write(self) -> Snapshot[DataType] | None:
+        """Persists the data if it changed, returns the new snapshot to publish if so
+
+        Must be called with the lock held.
+        """
+        contents = self.serializer(self._object)
+        new_digest = digest(contents)
+        if new_digest == self._digest:
+            _logger.debug(f"contents of {self._file} unchanged, skipping write")
+            return None
+
+        write_atomically(self._file, contents, opener=self.opener, binary=self.binary)
+        self._digest = new_digest
+        # deserializing is a cheap way to get a deep copy which readers can't interfere with
+        return Snapshot(self.deserializer(contents), self._snapshot.generation + 1, new_digest)
+
+    def _rollback(self):
+        """Reverts the data to the last persisted state, must be called with the lock held"""
+        data = copy.deepcopy(self._snapshot.data)
+        if isinstance(self._object, dict):
+            self._object.clear()
+            self._object.update(data)
+        else:
+            self._object[:] = data
+
+
+class SharedStorage[DataType: (dict, list), SerializedType](
+    CachedStorage[DataType, SerializedType]
+):
+    """CachedStorage whose file is shared with other processes
+
+    Changes are made while holding an inter-process lock (`<file>.lock`), and start from what
+    other processes saved in the meantime, so no change gets lost. To pick up changes of other
+    processes without changing anything, call `reload()` regularly. It only reads the file if
+    its modification time, size or inode changed, so that's cheap.
+
+    `file` must be a path, i.e. there's no opener.
+    """
+
+    def __init__(self, default: DataType, file: Path | str, **kwargs):
+        # shared by all threads, which take the thread lock first
+        self._file_lock = filelock.FileLock(f"{file}.lock", thread_local=False)
+        # modification time, size and inode of the file when it was last read or written, if
+        # that's old enough that any later change gives another one, see `_settled()`
+        self._stat: tuple[int, int, int] | None = None
+        # whether changes of other processes were taken over since the last `reload()`, also
+        # when that happened while locking
+        self._reloaded = False
+        # digest of what's on disk if it isn't valid, so it's only reported once
+        self._invalid_digest: bytes | None = None
+        super().__init__(default, file, **kwargs)
+
+    def _load(
+        self, validator: Callable[[DataType], bool], ignore_init_errors: list[type[Exception]]
+    ) -> bool:
+        self._validator = validator
+        stat = self._file_stat()
+        loaded = super()._load(validator, ignore_init_errors)
+        if not loaded and stat is not None:
+            # so the initial save replaces it, instead of reloading it
+            with open(self._file, f"r{'b' if self.binary else ''}") as f:
+                contents = f.read()
+            if self._parse(contents) is None:
+                self._invalid_digest = digest(contents)
+        self._stat = self._settled(stat)
+        return loaded
+
+    @contextmanager
+    def lock(self) -> Iterator[DataType]:
+        with self._manager as data, self._file_lock:
+            if self._file_lock.lock_counter == 1:
+                self._reload()
+            yield data
+
+    def set_item(self, path: Sequence, value) -> bool:
+        with self.lock():
+            return super().set_item(path, value)
+
+    def save(self) -> bool:
+        with self.lock():
+            return super().save()
+
+    def reload(self) -> bool:
+        """Takes over what other processes saved, returns whether the data changed
+
+        Changes taken over while locking since the last call count as well, so a caller which
+        keeps derived data up to date notices all of them.
+        """
+        with self._manager:
+            self._reload()
+            reloaded, self._reloaded = self._reloaded, False
+            return reloaded
+
+    def _file_stat(self) -> tuple[int, int, int] | None:
+        try:
+            stat = os.stat(self._file)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    @staticmethod
+    def _settled(stat: tuple[int, int, int] | None) -> tuple[int, int, int] | None:
+        """`stat` if it can be relied on, `None` if the file has to be read again next time
+
+        Modification times are coarse and inodes get reused, so a change right after the last one,
+        of the same size, could otherwise go unnoticed.
+        """
+        if stat is None or time.time_ns() - stat[0] < _MTIME_GRANULARITY_NS:
+            return None
+        return stat
+
+    def _parse(self, contents: SerializedType) -> DataType | None:
+        """The data in `contents`, `None` if it can't be deserialized or isn't valid"""
+        try:
+            data = self.deserializer(contents)
+        except Exception as e:
+            _logger.debug(f"error deserializing {self._file}: {e}")
+            return None
+        return data if self._validator(data) else None
+
+    def _reload(self) -> bool:
+        """Like `reload()`, must be called with the thread lock held"""
+        stat = self._file_stat()
+        if stat is None or stat == self._stat:
+            return False
+        with open(self._file, f"r{'b' if self.binary else ''}") as f:
+            contents = f.read()
+        self._stat = self._settled(stat)
+        new_digest = digest(contents)
+        if new_digest in (self._digest, self._invalid_digest):
+            return False
+        data = self._parse(contents)
+        if data is None:
+            _logger.error(f"{self._file} is invalid, keeping the current data")
+            self._invalid_digest = new_digest
+            return False
+
+        _logger.info(f"{self._file} was changed by another process, reloading")
+        if isinstance(self._object, dict):
+            self._object.clear()
+            self._object.update(data)
+        else:
+            self._object[:] = data
+        self._digest = new_digest
+        with _publishing():
+            self._snapshot = Snapshot(
+                self.deserializer(contents), self._snapshot.generation + 1, new_digest
             )
+        self._reloaded = True
+        return True
 
+    def _write(self) -> Snapshot[DataType] | None:
+        snapshot = super()._write()
+        if snapshot is not None:
+            self._stat = self._settled(self._file_stat())
+        return snapshot
 
-def write_if_needed(file: Path | str, new_contents, binary=False, opener: OpenType = open):
-    optional_b = "b" if binary else ""
-    try:
-        with opener(str(file), f"r{optional_b}") as f:
-            if new_contents == f.read():
-                _logger.debug(f"contents of {file} unchanged, skipping write")
+
+class JournaledStorage[DataType: dict, SerializedType](CachedStorage[DataType, SerializedType]):
+    """CachedStorage which persists `set_item()` calls by appending them to a journal
+
+    This makes small changes cost a small, constant amount of I/O, instead of rewriting the whole
+    file. The journal is replayed when loading. Once it grows beyond `compact_threshold` bytes,
+    it is compacted in the background, by doing a full `save()`.
+
+    The journal is always JSON, regardless of the serializer.
+    """
+
+    def __init__(
+        self,
+        default: DataType,
+        file: Path | str,
+        opener: OpenType = open,
+        compact_threshold: int = 64 * 1024,
+        **kwargs,
+    ):
+        self._journal_file = f"{file}.journal"
+        self._journal: IO[str] | None = None
+        self._journal_size = 0
+        self._compact_threshold = compact_threshold
+        self._compacting = False
+        super().__init__(default, file, opener, **kwargs)
+
+    def _load_changes(self) -> bool:
+        try:
+            with self.opener(self._journal_file, "r") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return False
+
+        self._journal_size = sum(len(line) for line in lines)
+        replayed = 0
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # most likely the last record, interrupted while being written
+                _logger.warning(f"skipping corrupt record in {self._journal_file}: {line!r}")
+                continue
+            try:
+                path = record["path"]
+                _get_parent(self._object, path)[path[-1]] = record["value"]
+                replayed += 1
+            except (KeyError, IndexError, TypeError) as e:
+                _logger.warning(f"skipping inapplicable record in {self._journal_file}: {e!r}")
+        _logger.info(f"replayed {replayed} records from {self._journal_file}")
+        # the initial save compacts the journal
+        return bool(lines)
+
+    def set_item(self, path: Sequence, value) -> bool:
+        with self._manager:
+            parent = _get_parent(self._object, path)
+            key = path[-1]
+            try:
+                if parent[key] == value:
+                    return False
+            except (KeyError, IndexError):
+                pass
+
+            parent[key] = value
+            self._append({"path": list(path), "value": value})
+            with _publishing():
+                self._snapshot = Snapshot(
+                    _with_item(self._snapshot.data, path, copy.deepcopy(value)),
+                    self._snapshot.generation + 1,
+                )
+
+            if self._journal_size > self._compact_threshold and not self._compacting:
+                self._compacting = True
+                threading.Thread(name="compact", target=self._compact, daemon=True).start()
+            return True
+
+    def _compact(self):
+        try:
+            self.save()
+        finally:
+            self._compacting = False
+
+    def _append(self, record: dict[str, Any]):
+        if self._journal is None:
+            self._journal = self.opener(self._journal_file, "a")
+        line = json.dumps(record) + "\n"
+        self._journal.write(line)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._journal_size += len(line)
+
+    def _write(self) -> Snapshot[DataType] | None:
+        snapshot = super()._write()
+        # everything in the journal is in the main file now
+        if self._journal_size:
+            if self._journal is None:
+                self._journal = self.opener(self._journal_file, "a")
+            self._journal.seek(0)
+            self._journal.truncate()
+            self._journal_size = 0
+        return snapshot
+
+
+class SqliteStorage[DataType: (dict, list)](CachedStorage[DataType, str]):
+    """CachedStorage which persists to an SQLite database instead of a JSON file
+
+    Every top-level item is a row, so saving only writes the items which changed, and
+    `set_item()` only writes a single row. Several stores can share one database, each is
+    identified by `store`. For lists, `key_field` identifies the items (e.g. act ID); the list
+    order is kept as well. `get()` looks up single items using the database's index.
+
+    If the store doesn't have any rows yet, the data is migrated from the JSON file
+    `migrate_from` (if it exists).
+    """
+
+    def __init__(
+        self,
+        default: DataType,
+        database: Path | str,
+        store: str,
+        key_field: str | None = None,
+        migrate_from: Path | str | None = None,
+        validator: Callable[[DataType], bool] = lambda _: True,
+    ):
+        self._store = store
+        self._key_field = key_field
+        self._migrate_from = migrate_from
+        # the storage lock protects the data, this one the connection (which `get()` also uses)
+        self._db_lock = threading.Lock()
+        self._connection = sqlite3.connect(database, check_same_thread=False)
+        # key -> (position, JSON) of the rows as persisted
+        self._rows: dict[str, tuple[int, str]] = {}
+        with self._db_lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS items ("
+                "store TEXT NOT NULL, key TEXT NOT NULL, position INTEGER NOT NULL, "
+                "value TEXT NOT NULL, PRIMARY KEY (store, key))"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS items_position ON items (store, position)"
+            )
+        super().__init__(default, f"{database}:{store}", validator=validator)
+
+    def _load(
+        self, validator: Callable[[DataType], bool], ignore_init_errors: list[type[Exception]]
+    ) -> bool:
+        with self._db_lock:
+            rows = self._connection.execute(
+                "SELECT key, position, value FROM items WHERE store = ? ORDER BY position",
+                (self._store,),
+            ).fetchall()
+        if not rows:
+            return self._migrate(validator)
+
+        data = self._assemble((key, json.loads(value)) for key, _, value in rows)
+        if not validator(data):
+            _logger.error(f"data validation failed for {self._file}, using default value")
+            return False
+        self._object = data
+        self._rows = {key: (position, value) for key, position, value in rows}
+        self._snapshot = Snapshot(copy.deepcopy(data), 0)
+        _logger.debug(f"loaded {self._file}")
+        return True
+
+    def _migrate(self, validator: Callable[[DataType], bool]) -> bool:
+        """Takes the data from the JSON file, returns whether there was valid data"""
+        if self._migrate_from is None:
+            return False
+        try:
+            with open(self._migrate_from) as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            _logger.info(f"not migrating {self._migrate_from} to {self._file}: {e}")
+            return False
+        if not validator(data):
+            _logger.error(f"data validation failed for {self._migrate_from}, not migrating")
+            return False
+        _logger.info(f"migrating {self._migrate_from} to {self._file}")
+        self._object = data
+        # no rows yet, so the initial save writes everything
+        return False
+
+    def _key(self, key, item) -> str:
+        return str(item[self._key_field]) if self._key_field is not None else key
+
+    def _items(self, data: DataType) -> list[tuple[str, Any]]:
+        """Returns the (row key, item) pairs of the data, in order"""
+        if isinstance(data, dict):
+            return list(data.items())
+        items = [(self._key(None, item), item) for item in data]
+        if len({key for key, _ in items}) != len(items):
+            raise ValueError(f"duplicate values of '{self._key_field}' in {self._file}")
+        return items
+
+    def _assemble(self, items) -> DataType:
+        if self._key_field is None:
+            return dict(items)
+        return [item for _, item in items]
+
+    def _write(self) -> Snapshot[DataType] | None:
+        rows = {
+            key: (position, json.dumps(item))
+            for position, (key, item) in enumerate(self._items(self._object))
+        }
+        changed = {key: row for key, row in rows.items() if self._rows.get(key) != row}
+        removed = [key for key in self._rows if key not in rows]
+        if not changed and not removed:
+            _logger.debug(f"contents of {self._file} unchanged, skipping write")
+            return None
+
+        self._execute(changed, removed)
+        self._rows = rows
+        # unchanged items can be shared with the previous snapshot
+        previous = dict(self._items(self._snapshot.data))
+        data = self._assemble(
+            (key, json.loads(value) if key in changed else previous[key])
+            for key, (_, value) in rows.items()
+        )
+        return Snapshot(data, self._snapshot.generation + 1)
+
+    def _execute(self, changed: dict[str, tuple[int, str]], removed: list[str]):
+        _logger.debug(f"writing {len(changed)} and removing {len(removed)} rows of {self._file}")
+        with self._db_lock, self._connection:
+            self._connection.executemany(
+                "INSERT INTO items (store, key, position, value) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (store, key) DO UPDATE "
+                "SET position = excluded.position, value = excluded.value",
+                [(self._store, key, position, value) for key, (position, value) in changed.items()],
+            )
+            self._connection.executemany(
+                "DELETE FROM items WHERE store = ? AND key = ?",
+                [(self._store, key) for key in removed],
+            )
+
+    def set_item(self, path: Sequence, value) -> bool:
+        with self._manager:
+            parent = _get_parent(self._object, path)
+            parent[path[-1]] = value
+            top_key = self._key(path[0], self._object[path[0]])
+            if top_key not in self._rows:
+                # a new row (or a changed key), which may affect the order
+                return self.save()
+            position, _ = self._rows[top_key]
+            row = (position, json.dumps(self._object[path[0]]))
+            if self._rows.get(top_key) == row:
+                return False
+
+            self._execute({top_key: row}, [])
+            self._rows[top_key] = row
+            with _publishing():
+                self._snapshot = Snapshot(
+                    _with_item(self._snapshot.data, path, copy.deepcopy(value)),
+                    self._snapshot.generation + 1,
+                )
+            return True
+
+    def get(self, key: str) -> Any | None:
+        """Returns the persisted item with the given key (e.g. act ID), or `None`"""
+        with self._db_lock:
+            row = self._connection.execute(
+                "SELECT value FROM items WHERE store = ? AND key = ?", (self._store, key)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+
+def _get_parent(data, path: Sequence):
+    for key in path[:-1]:
+        data = data[key]
+    return data
+
+
+def _with_item(data, path: Sequence, value):
+    """Returns a copy of `data` with an item set, only copying the containers along the path"""
+    data = data.copy()
+    key = path[0]
+    data[key] = value if len(path) == 1 else _with_item(data[key], path[1:], value)
+    return data
+
+
+def snapshots(*storages: CachedStorage) -> tuple[Snapshot, ...]:
+    """Returns snapshots of several storages, consistent with each other
+
+    Unlike calling `CachedStorage.snapshot()` one by one, this never returns some storages from
+    before and some from after a `Transaction`. Doesn't take any lock.
+    """
+    while True:
+        sequence = _publish_sequence
+        if sequence % 2 == 0:
+            result = tuple(storage.snapshot() for storage in storages)
+            if _publish_sequence == sequence:
+                return result
+        # let the publisher finish
+        time.sleep(0)
+
+
+class Transaction:
+    """Locks several storages at once, to modify them together
+
+    The locks are always taken in the order in which the storages were created, whatever order
+    they're passed in, so transactions can't deadlock each other. Entering yields the storages'
+    data in the order given. When the block completes, all storages which changed are persisted
+    and their new snapshots published at once (see `snapshots()`). When it raises, their data is
+    rolled back to the last persisted state.
+
+    Persisting is atomic per storage, but not across them: if a write fails, the storages written
+    before keep (and publish) their new contents, and the others are rolled back.
+
+    After the block, `changed` holds the storages whose persisted contents changed.
+    """
+
+    def __init__(self, *storages: CachedStorage):
+        self._storages = storages
+        self._ordered = sorted(set(storages), key=lambda storage: storage._order)
+        self._locks = ExitStack()
+        self.changed: list[CachedStorage] = []
+
+    def __enter__(self) -> tuple:
+        data = {}
+        with ExitStack() as stack:
+            for storage in self._ordered:
+                data[storage] = stack.enter_context(storage.lock())
+            self._locks = stack.pop_all()
+        return tuple(data[storage] for storage in self._storages)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with self._locks:
+            if exc_type is not None:
+                for storage in self._ordered:
+                    storage._rollback()
                 return
-    except FileNotFoundError:
-        _logger.debug(f"creating {file}")
 
+            new_snapshots = {}
+            written = set()
+            try:
+                for storage in self._ordered:
+                    snapshot = storage._write()
+                    written.add(storage)
+                    if snapshot is not None:
+                        new_snapshots[storage] = snapshot
+            except BaseException:
+                # otherwise their unsaved changes would be persisted by whatever saves them next
+                for storage in self._ordered:
+                    if storage not in written:
+                        storage._rollback()
+                raise
+            finally:
+                # also publish what made it to disk if a later write failed
+                with _publishing():
+                    for storage, snapshot in new_snapshots.items():
+                        storage._snapshot = snapshot
+                self.changed = list(new_snapshots)
+
+
+def digest(contents: str | bytes) -> bytes:
+    if isinstance(contents, str):
+        contents = contents.encode("utf-8")
+    return hashlib.blake2b(contents).digest()
+
+
+def write_atomically(file: Path | str, contents, binary=False, opener: OpenType = open):
+    """Writes to a temporary file first and then renames it, so `file` is never half-written"""
+    optional_b = "b" if binary else ""
     _logger.debug(f"writing {file}")
-    with opener(str(file), f"w{optional_b}") as f:
-        f.write(new_contents)
+    with opener(f"{file}.tmp", f"w{optional_b}") as f:
+        f.write(contents)
+        f.flush()
+        os.fsync(f.fileno())
+        # the opener may have resolved the name (e.g. relative to the instance folder)
+        tmp_path = f.name
+    path = tmp_path.removesuffix(".tmp")
+    os.replace(tmp_path, path)
+
+    # make the rename itself durable as well (not possible on all platforms)
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -0,0 +1,56 @@
+import gzip
+from unittest.mock import MagicMock
+
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+from ..compression import CompressionCache, choose_encoding, is_compressible
+
+BODY = b'{"acts": {"foo": {"description": "Description of Foo"}}}' * 20
+
+
+def test_compressed_once_per_version():
+    cache = CompressionCache()
+    body = MagicMock(return_value=BODY)
+
+    compressed = cache.get("programme", 1, "gzip", body)
+    assert gzip.decompress(compressed) == BODY
+    assert len(compressed) < len(BODY)
+    assert cache.get("programme", 1, "gzip", body) is compressed
+    body.assert_called_once()
+
+    cache.get("programme", 2, "gzip", body)
+    assert body.call_count == 2
+
+
+def test_not_smaller():
+    cache = CompressionCache()
+    assert cache.get("tiny", 1, "gzip", lambda: b"{}") is None
+
+
+def test_least_recently_used_dropped():
+    cache = CompressionCache(max_entries=2)
+    body = MagicMock(return_value=BODY)
+    cache.get("a", 1, "gzip", body)
+    cache.get("b", 1, "gzip", body)
+    cache.get("a", 1, "gzip", body)
+    cache.get("c", 1, "gzip", body)
+    assert body.call_count == 3
+
+    cache.get("a", 1, "gzip", body)
+    assert body.call_count == 3
+    cache.get("b", 1, "gzip", body)
+    assert body.call_count == 4
+
+
+def test_choose_encoding():
+    assert choose_encoding(parse_accept_header("gzip, deflate", Accept)) == "gzip"
+    assert choose_encoding(parse_accept_header("gzip;q=0", Accept)) is None
+    assert choose_encoding(parse_accept_header("", Accept)) is None
+
+
+def test_is_compressible():
+    assert is_compressible("application/json")
+    assert is_compressible("text/calendar")
+    assert not is_compressible("image/png")
+    assert not is_compressible(None)
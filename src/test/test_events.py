@@ -0,0 +1,46 @@
+import threading
+from ..events import EventBroadcaster
+
+
+def test_events_since():
+    broadcaster = EventBroadcaster()
+    start = broadcaster.last_id
+    first = broadcaster.publish("itinerary", act="foo")
+    second = broadcaster.publish("programme")
+
+    assert broadcaster.events_since(start) == [first, second]
+    assert broadcaster.events_since(first.id) == [second]
+    assert broadcaster.events_since(second.id) == []
+    assert second.id > first.id > start
+
+
+def test_events_since_outside_history():
+    broadcaster = EventBroadcaster(history_size=2)
+    start = broadcaster.last_id
+    for _ in range(3):
+        broadcaster.publish("programme")
+
+    assert broadcaster.events_since(start) is None
+    assert len(broadcaster.events_since(start + 1)) == 2
+    # e.g. a client from before a restart
+    assert broadcaster.events_since(broadcaster.last_id + 1) is None
+
+
+def test_wait():
+    broadcaster = EventBroadcaster()
+    start = broadcaster.last_id
+    assert broadcaster.wait(start, timeout=0.01) == []
+
+    timer = threading.Timer(0.05, broadcaster.publish, args=["programme"])
+    timer.start()
+    events = broadcaster.wait(start, timeout=10)
+    timer.join()
+    assert [event.type for event in events] == ["programme"]
+
+
+def test_to_sse():
+    broadcaster = EventBroadcaster()
+    event = broadcaster.publish("itinerary", act="foo", generation=3)
+    assert event.to_sse() == (
+        f"id: {event.id}\nevent: itinerary\ndata: " '{"act": "foo", "generation": 3}\n\n'
+    )
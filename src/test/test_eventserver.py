@@ -0,0 +1,84 @@
+import socket
+
+import pytest
+
+from ..events import EventBroadcaster
+from ..eventserver import EventStreamServer
+
+
+@pytest.fixture
+def broadcaster():
+    return EventBroadcaster(history_size=2)
+
+
+def start(broadcaster: EventBroadcaster, **kwargs) -> EventStreamServer:
+    kwargs = {"retry_seconds": 15, "keepalive_seconds": 10} | kwargs
+    server = EventStreamServer(broadcaster, "127.0.0.1", 0, **kwargs)
+    server.start()
+    return server
+
+
+def request(server: EventStreamServer, head: str) -> socket.socket:
+    sock = socket.create_connection(("127.0.0.1", server.port), timeout=5)
+    sock.sendall(head.encode() + b"\r\n\r\n")
+    return sock
+
+
+def read_until(sock: socket.socket, end: bytes | None = None) -> str:
+    """Reads until the data ends with `end`, or the connection is closed"""
+    data = b""
+    while end is None or not data.endswith(end):
+        chunk = sock.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data.decode()
+
+
+def test_stream(broadcaster):
+    server = start(broadcaster)
+    last_id = broadcaster.last_id
+    with request(server, "GET /events HTTP/1.1") as sock:
+        head = read_until(sock, f"id: {last_id}\n\n".encode())
+        assert head.startswith("HTTP/1.1 200 OK\r\n")
+        assert "Content-Type: text/event-stream" in head
+        assert "retry: 15000\n" in head
+
+        event = broadcaster.publish("itinerary", act="foo")
+        assert read_until(sock, b"\n\n") == event.to_sse()
+
+
+def test_last_event_id(broadcaster):
+    server = start(broadcaster, hold_seconds=0.1)
+    start_id = broadcaster.last_id
+    event = broadcaster.publish("programme")
+
+    with request(server, f"GET /events HTTP/1.1\r\nLast-Event-ID: {start_id}") as sock:
+        assert read_until(sock).endswith(f"id: {start_id}\n\n{event.to_sse()}")
+
+    # e.g. a client from before a restart
+    with request(server, f"GET /events HTTP/1.1\r\nLast-Event-ID: {start_id - 1}") as sock:
+        assert read_until(sock).endswith(f"id: {event.id}\nevent: reset\ndata: {{}}\n\n")
+
+    with request(server, "GET /events HTTP/1.1\r\nLast-Event-ID: foo") as sock:
+        assert read_until(sock).startswith("HTTP/1.1 400 ")
+
+
+def test_keepalive_and_hold(broadcaster):
+    server = start(broadcaster, keepalive_seconds=0.05, hold_seconds=0.3)
+    with request(server, "GET /events HTTP/1.1") as sock:
+        # closed after the hold time
+        assert read_until(sock).endswith(": keepalive\n\n")
+    assert server.clients == 0
+
+
+def test_other_requests(broadcaster):
+    server = start(broadcaster)
+    with request(server, "GET /programme HTTP/1.1") as sock:
+        assert read_until(sock).startswith("HTTP/1.1 404 ")
+    with request(server, "POST /events HTTP/1.1") as sock:
+        assert read_until(sock).startswith("HTTP/1.1 405 ")
+    with request(server, "OPTIONS /events HTTP/1.1") as sock:
+        response = read_until(sock)
+        assert response.startswith("HTTP/1.1 204 ")
+        assert "Access-Control-Allow-Headers: Last-Event-ID" in response
@@ -0,0 +1,55 @@
+import pytest
+import requests
+import responses
+
+from ..httpclient import CircuitBreaker, CircuitOpenError, create_session
+
+URL = "https://upstream.fake/acts"
+
+
+@pytest.fixture
+def clock():
+    class Clock:
+        now = 0.0
+
+        def __call__(self):
+            return self.now
+
+    return Clock()
+
+
+def test_default_timeout():
+    session = create_session(connect_timeout=1, read_timeout=2)
+    with responses.RequestsMock() as rsps:
+        rsps.get(URL, json=[])
+        session.get(URL)
+        session.get(URL, timeout=3)
+        assert rsps.calls[0].request.req_kwargs["timeout"] == (1, 2)
+        assert rsps.calls[1].request.req_kwargs["timeout"] == 3
+
+
+def test_retries():
+    session = create_session(retries=2, backoff=0)
+    with responses.RequestsMock() as rsps:
+        rsps.get(URL, status=503)
+        rsps.get(URL, status=503)
+        rsps.get(URL, json=[])
+        assert session.get(URL).json() == []
+        assert len(rsps.calls) == 3
+
+
+def test_circuit_breaker(clock):
+    session = create_session(retries=0, breaker=CircuitBreaker(2, cooldown=60, clock=clock))
+    with responses.RequestsMock() as rsps:
+        rsps.get(URL, body=requests.ConnectionError("down"))
+        for _ in range(2):
+            with pytest.raises(requests.ConnectionError):
+                session.get(URL)
+        with pytest.raises(CircuitOpenError):
+            session.get(URL)
+        assert len(rsps.calls) == 2
+
+        clock.now = 61
+        rsps.replace(responses.GET, URL, json=[])
+        assert session.get(URL).json() == []
+        assert len(rsps.calls) == 3
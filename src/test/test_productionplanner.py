@@ -1,5 +1,11 @@
 import pytest
-from ..productionplanner import remove_friends_night_tag
+from ..productionplanner import (
+    Act,
+    ParsedActs,
+    ShowIndex,
+    diff_acts,
+    remove_friends_night_tag,
+)
 
 
 @pytest.mark.parametrize(
@@ -16,3 +22,94 @@ from ..productionplanner import remove_friends_night_tag
 )
 def test_remove_friends_night_tag(input, output):
     assert remove_friends_night_tag(input) == output
+
+
+def act(id, name="act", start="2025-08-09 21:00:00", end="2025-08-09 22:00:00", stage="Amigo"):
+    return {
+        "id": id,
+        "name": name,
+        "timeline": [{"type": "Showtime", "start": start, "end": end, "stage": stage}],
+    }
+
+
+def test_diff_acts_unchanged():
+    acts = [act(1), act(2)]
+    assert not diff_acts(acts, [act(1), act(2)])
+
+
+def test_diff_acts():
+    old = [act(1), act(2), act(3), act(4)]
+    new = [act(1), act(5), act(3, name="renamed"), act(4, start="2025-08-09 22:00:00")]
+    diff = diff_acts(old, new)
+    assert diff
+    assert diff.added == {"5": new[1]}
+    assert diff.removed == {"2": old[1]}
+    assert diff.modified == {"3": (old[2], new[2]), "4": (old[3], new[3])}
+    assert diff.rescheduled == {"4"}
+    assert not diff.reordered
+    assert diff.keys() == {"2", "3", "4", "5"}
+    assert diff.summary()["modified"] == ["3", "4"]
+
+
+def test_diff_acts_reordered():
+    diff = diff_acts([act(1), act(2)], [act(2), act(1)])
+    assert diff
+    assert diff.reordered
+    assert not diff.keys()
+
+
+def test_parse_act():
+    parsed = Act(act(1))
+    assert parsed.key == "1"
+    assert parsed.stages == {"Amigo"}
+    (show,) = parsed.shows
+    assert show.legacy_stage == "AMIGO"
+    assert show.legacy_start == "21:00"
+    assert show.legacy_end == "22:00"
+    assert show.start_utc == 1754766000
+    assert show.end_utc == show.start_utc + 3600
+    # saturday
+    assert show.day == 5
+
+
+def test_festival_day_after_midnight():
+    show = Act(act(1, start="2025-08-10 01:00:00", end="2025-08-10 02:00:00")).shows[0]
+    assert show.day == 5
+
+
+def test_parsed_acts():
+    parsed_acts = ParsedActs()
+    old = parsed_acts.get([act(1), act(2)], generation=1)
+    assert parsed_acts.get([act(1), act(2)], generation=1) is old
+    new = parsed_acts.get([act(1), act(2, name="renamed")], generation=2)
+    assert new[0] is old[0]
+    assert new[1].name == "renamed"
+
+
+def test_show_index():
+    acts = [
+        Act(act(1, start="2025-08-09 22:00:00", end="2025-08-09 23:00:00")),
+        Act(act(2, start="2025-08-09 21:00:00", stage="Main")),
+        Act(act(3, start="2025-08-10 01:00:00", end="2025-08-10 02:00:00")),
+        Act(act(4, start="2025-08-10 20:00:00", end="2025-08-10 21:00:00")),
+    ]
+    index = ShowIndex(acts)
+
+    def keys(shows):
+        return [act.key for act, _ in shows]
+
+    assert keys(index.shows()) == ["2", "1", "3", "4"]
+    assert keys(index.shows("AMIGO")) == ["1", "3", "4"]
+    # after midnight still belongs to saturday
+    assert keys(index.shows("AMIGO", day=5)) == ["1", "3"]
+    assert keys(index.shows(day=6)) == ["4"]
+    assert keys(index.shows("NONEXISTENT")) == []
+    start = acts[0].shows[0].start_utc
+    assert keys(index.shows(start_from=start, start_before=start + 4 * 3600)) == ["1", "3"]
+
+
+def test_parsed_acts_index():
+    parsed_acts = ParsedActs()
+    index = parsed_acts.index([act(1)], generation=1)
+    assert parsed_acts.index([act(1)], generation=1) is index
+    assert parsed_acts.index([act(1), act(2)], generation=2) is not index
@@ -1,8 +1,18 @@
+import io
+import threading
+import time
 from pathlib import Path
 import json
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 import pytest
-from ..storage import CachedStorage
+from ..storage import (
+    CachedStorage,
+    JournaledStorage,
+    SharedStorage,
+    SqliteStorage,
+    Transaction,
+    snapshots,
+)
 
 
 @pytest.fixture
@@ -101,13 +111,39 @@ def test_skip_identical_write(mock_open):
         data.update(update)
         storage.save()
 
-    mock_open.assert_called_with(filename, "w")
+    mock_open.assert_called_with(f"{filename}.tmp", "w")
 
     mock_open.reset_mock()
     with storage.lock() as data:
         storage.save()
 
-    mock_open.assert_called_once_with(filename, "r")
+    # no need to read back the file either
+    mock_open.assert_not_called()
+
+
+def test_atomic_write(tmp_path):
+    filename = "foo.json"
+    crash = False
+
+    class CrashingFile(io.TextIOWrapper):
+        def write(self, s):
+            super().write(s[:3])
+            raise OSError("killed mid-write")
+
+    def opener(name, mode):
+        if crash and "w" in mode:
+            return CrashingFile(open(tmp_path / name, mode + "b"))
+        return open(tmp_path / name, mode)
+
+    storage = CachedStorage({"foo": 42}, filename, opener=opener)
+    crash = True
+    with storage.lock() as data:
+        data["foo"] = 43
+        with pytest.raises(OSError):
+            storage.save()
+
+    with open(tmp_path / filename) as f:
+        assert json.load(f) == {"foo": 42}
 
 
 def test_open_without_persisting(mock_open):
@@ -118,3 +154,375 @@ def test_open_without_persisting(mock_open):
         pass
 
     mock_open.assert_not_called()
+
+
+def test_save_reports_change(tmp_json_path):
+    storage = CachedStorage({}, tmp_json_path)
+
+    with storage.lock() as data:
+        assert not storage.save()
+        data["foo"] = 42
+        assert storage.save()
+        assert not storage.save()
+
+
+def test_generation(tmp_json_path):
+    storage = CachedStorage({}, tmp_json_path)
+    initial = storage.generation
+
+    with storage.lock() as data:
+        storage.save()
+        assert storage.generation == initial
+
+        data["foo"] = 42
+        storage.save()
+        assert storage.generation == initial + 1
+
+        storage.save()
+        assert storage.generation == initial + 1
+
+
+def test_snapshot(tmp_json_path):
+    storage = CachedStorage({"foo": {"bar": 1}}, tmp_json_path)
+    before = storage.snapshot()
+    assert before.data == {"foo": {"bar": 1}}
+
+    with storage.lock() as data:
+        data["foo"]["bar"] = 2
+        # not visible until saved
+        assert storage.snapshot() is before
+        storage.save()
+
+    after = storage.snapshot()
+    assert after.data == {"foo": {"bar": 2}}
+    assert after.generation == before.generation + 1 == storage.generation
+    assert before.data == {"foo": {"bar": 1}}
+
+    # snapshots don't share anything with the live data
+    with storage.lock() as data:
+        data["foo"]["bar"] = 3
+    assert after.data == {"foo": {"bar": 2}}
+
+
+def test_snapshot_readers_not_blocked_by_writer(tmp_json_path):
+    """Readers keep going at full speed while a (slow) writer holds the lock"""
+    storage = CachedStorage({"counter": 0}, tmp_json_path)
+    writer_holds_lock = threading.Event()
+    readers_done = threading.Event()
+    reads_per_reader = 10000
+    num_readers = 8
+
+    def writer():
+        with storage.lock() as data:
+            writer_holds_lock.set()
+            data["counter"] += 1
+            # e.g. slow disk, or a large update
+            assert readers_done.wait(timeout=30)
+            storage.save()
+
+    def reader(results: list[int]):
+        writer_holds_lock.wait()
+        for _ in range(reads_per_reader):
+            results.append(storage.snapshot().data["counter"])
+
+    results = [[] for _ in range(num_readers)]
+    writer_thread = threading.Thread(target=writer)
+    reader_threads = [threading.Thread(target=reader, args=[r]) for r in results]
+    writer_thread.start()
+    for thread in reader_threads:
+        thread.start()
+    for thread in reader_threads:
+        thread.join(timeout=30)
+    readers_done.set()
+    writer_thread.join(timeout=30)
+
+    assert all(result == [0] * reads_per_reader for result in results)
+    assert storage.snapshot().data["counter"] == 1
+
+
+@pytest.fixture
+def two_storages(tmp_path):
+    return CachedStorage({"n": 0}, tmp_path / "a.json"), CachedStorage(
+        {"n": 0}, tmp_path / "b.json"
+    )
+
+
+def test_transaction(two_storages):
+    a, b = two_storages
+    transaction = Transaction(b, a)
+    with transaction as (data_b, data_a):
+        data_a["n"] = 1
+        data_b["n"] = 2
+
+    assert a.snapshot().data == {"n": 1}
+    assert b.snapshot().data == {"n": 2}
+    assert set(transaction.changed) == {a, b}
+    with open(a._file) as f:
+        assert json.load(f) == {"n": 1}
+
+    transaction = Transaction(a, b)
+    with transaction as (data_a, data_b):
+        data_a["n"] = 3
+    assert transaction.changed == [a]
+
+
+def test_transaction_rollback(two_storages):
+    a, b = two_storages
+    with pytest.raises(RuntimeError):
+        with Transaction(a, b) as (data_a, data_b):
+            data_a["n"] = 1
+            data_b["n"] = 1
+            raise RuntimeError
+
+    for storage in two_storages:
+        with storage.lock() as data:
+            assert data == {"n": 0}
+        assert storage.snapshot().data == {"n": 0}
+
+
+def test_transaction_write_fails(two_storages):
+    a, b = two_storages
+    transaction = Transaction(a, b)
+    with patch.object(b, "_write", side_effect=OSError("disk full")):
+        with pytest.raises(OSError):
+            with transaction as (data_a, data_b):
+                data_a["n"] = 1
+                data_b["n"] = 1
+
+    # the first write isn't undone, the second storage doesn't keep the unsaved change
+    assert transaction.changed == [a]
+    assert a.snapshot().data == {"n": 1}
+    assert b.snapshot().data == {"n": 0}
+    with b.lock() as data:
+        assert data == {"n": 0}
+    with open(b._file) as f:
+        assert json.load(f) == {"n": 0}
+
+
+def test_transactions_concurrent(two_storages):
+    """Transactions in opposite orders don't deadlock, and readers always see consistent data"""
+    a, b = two_storages
+    iterations = 200
+    inconsistent = []
+    done = threading.Event()
+
+    def writer(*storages):
+        for _ in range(iterations):
+            with Transaction(*storages) as (first, second):
+                first["n"] += 1
+                second["n"] += 1
+
+    def reader():
+        while not done.is_set():
+            snapshot_a, snapshot_b = snapshots(a, b)
+            if snapshot_a.data != snapshot_b.data:
+                inconsistent.append((snapshot_a, snapshot_b))
+            # don't starve the writers
+            time.sleep(0.0001)
+
+    writers = [threading.Thread(target=writer, args=order) for order in [(a, b), (b, a)]]
+    readers = [threading.Thread(target=reader) for _ in range(2)]
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join(timeout=30)
+        assert not thread.is_alive(), "deadlock"
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    assert not inconsistent
+    assert a.snapshot().data == b.snapshot().data == {"n": 2 * iterations}
+
+
+def test_set_item(tmp_json_path):
+    storage = CachedStorage({"foo": {"bar": 1}}, tmp_json_path)
+    assert storage.set_item(["foo", "bar"], 2)
+    assert not storage.set_item(["foo", "bar"], 2)
+    with pytest.raises(KeyError):
+        storage.set_item(["nonexistent", "bar"], 2)
+
+    with open(tmp_json_path) as f:
+        assert json.load(f) == {"foo": {"bar": 2}}
+
+
+def test_journal(tmp_path, mock_open):
+    filename = "foo.json"
+    storage = JournaledStorage({"foo": {"bar": 1}, "baz": {}}, filename, opener=mock_open)
+    before = storage.snapshot()
+    mock_open.reset_mock()
+
+    assert storage.set_item(["foo", "bar"], 2)
+    assert storage.set_item(["foo", "bar"], 3)
+    assert not storage.set_item(["foo", "bar"], 3)
+
+    # only appended to the journal, which is kept open
+    mock_open.assert_called_once_with(f"{filename}.journal", "a")
+    with open(tmp_path / filename) as f:
+        assert json.load(f) == {"foo": {"bar": 1}, "baz": {}}
+
+    after = storage.snapshot()
+    assert after.data == {"foo": {"bar": 3}, "baz": {}}
+    assert after.generation == before.generation + 2
+    assert before.data == {"foo": {"bar": 1}, "baz": {}}
+    assert after.data["baz"] is before.data["baz"]
+
+    # replayed (and compacted) when loading
+    reloaded = JournaledStorage({}, filename, opener=mock_open)
+    with reloaded.lock() as data:
+        assert data == {"foo": {"bar": 3}, "baz": {}}
+    with open(tmp_path / filename) as f:
+        assert json.load(f) == {"foo": {"bar": 3}, "baz": {}}
+    assert (tmp_path / f"{filename}.journal").read_text() == ""
+
+
+def test_journal_interrupted_record(tmp_json_path):
+    storage = JournaledStorage({"foo": 1}, tmp_json_path)
+    storage.set_item(["foo"], 2)
+    with open(f"{tmp_json_path}.journal", "a") as f:
+        f.write('{"path": ["foo"], "val')
+
+    reloaded = JournaledStorage({}, tmp_json_path)
+    with reloaded.lock() as data:
+        assert data == {"foo": 2}
+
+
+def test_journal_compaction(tmp_json_path):
+    storage = JournaledStorage({"foo": 0}, tmp_json_path, compact_threshold=100)
+    journal = Path(f"{tmp_json_path}.journal")
+    for i in range(1, 10):
+        storage.set_item(["foo"], i)
+
+    for _ in range(100):
+        if journal.stat().st_size < 100:
+            break
+        time.sleep(0.01)
+    assert journal.stat().st_size < 100
+    with open(tmp_json_path) as f:
+        assert json.load(f)["foo"] > 0
+
+
+def test_sqlite_round_trip(tmp_path):
+    database = tmp_path / "storage.sqlite3"
+    acts = SqliteStorage([], database, "acts", key_field="id")
+    itinerary = SqliteStorage({}, database, "itinerary")
+    with acts.lock() as data:
+        data.extend([{"id": 2, "name": "b"}, {"id": 1, "name": "a"}])
+    assert acts.save()
+    assert not acts.save()
+    assert itinerary.set_item(["2"], {"dressing_room": "1"})
+
+    assert SqliteStorage([], database, "acts", key_field="id").snapshot().data == [
+        {"id": 2, "name": "b"},
+        {"id": 1, "name": "a"},
+    ]
+    assert SqliteStorage({}, database, "itinerary").snapshot().data == {"2": {"dressing_room": "1"}}
+    assert acts.get("1") == {"id": 1, "name": "a"}
+    assert acts.get("3") is None
+
+
+def test_sqlite_writes_changed_rows(tmp_path):
+    storage = SqliteStorage({"foo": {"bar": 1}, "baz": {}}, tmp_path / "db", "store")
+    before = storage.snapshot()
+    with patch.object(storage, "_execute", wraps=storage._execute) as execute:
+        assert storage.set_item(["foo", "bar"], 2)
+        assert not storage.set_item(["foo", "bar"], 2)
+        execute.assert_called_once_with({"foo": (0, '{"bar": 2}')}, [])
+
+        with storage.lock() as data:
+            del data["baz"]
+        assert storage.save()
+        execute.assert_called_with({}, ["baz"])
+
+    assert before.data == {"foo": {"bar": 1}, "baz": {}}
+    assert SqliteStorage({}, tmp_path / "db", "store").snapshot().data == {"foo": {"bar": 2}}
+
+
+def test_sqlite_duplicate_keys(tmp_path):
+    storage = SqliteStorage([], tmp_path / "db", "acts", key_field="id")
+    with storage.lock() as data:
+        data.extend([{"id": 1}, {"id": 1}])
+    with pytest.raises(ValueError):
+        storage.save()
+
+
+def test_sqlite_migration(tmp_json_path, tmp_path):
+    with open(tmp_json_path, "w") as f:
+        json.dump([{"id": 1}], f)
+
+    storage = SqliteStorage([], tmp_path / "db", "acts", key_field="id", migrate_from=tmp_json_path)
+    assert storage.snapshot().data == [{"id": 1}]
+
+    # the database takes precedence once it has data
+    with open(tmp_json_path, "w") as f:
+        json.dump([{"id": 2}], f)
+    storage = SqliteStorage([], tmp_path / "db", "acts", key_field="id", migrate_from=tmp_json_path)
+    assert storage.snapshot().data == [{"id": 1}]
+
+
+def test_transaction_mixed_backends(tmp_json_path, tmp_path):
+    a = CachedStorage({"n": 0}, tmp_json_path)
+    b = SqliteStorage({"n": 0}, tmp_path / "db", "b")
+    with Transaction(a, b) as (data_a, data_b):
+        data_a["n"] = data_b["n"] = 1
+    with pytest.raises(RuntimeError):
+        with Transaction(a, b) as (data_a, data_b):
+            data_a["n"] = data_b["n"] = 2
+            raise RuntimeError
+
+    assert a.snapshot().data == b.snapshot().data == {"n": 1}
+    assert SqliteStorage({}, tmp_path / "db", "b").snapshot().data == {"n": 1}
+
+
+def test_shared(tmp_json_path):
+    # like two processes, which only share the file
+    a = SharedStorage({"foo": 1, "bar": 1}, tmp_json_path)
+    b = SharedStorage({}, tmp_json_path)
+    assert not b.reload()
+
+    assert a.set_item(["foo"], 2)
+    assert b.reload()
+    assert not b.reload()
+    assert b.snapshot().data == a.snapshot().data == {"foo": 2, "bar": 1}
+    assert b.snapshot().digest == a.snapshot().digest
+
+    # changes start from what the other one saved, even without reloading first
+    assert a.set_item(["foo"], 3)
+    assert b.set_item(["bar"], 3)
+    with b.lock() as data:
+        data["bar"] = 4
+        b.save()
+    assert a.reload()
+    assert a.snapshot().data == b.snapshot().data == {"foo": 3, "bar": 4}
+    # which b took over while locking
+    assert b.reload()
+    assert not b.reload()
+
+    # quick changes of the same size are noticed as well
+    for i in range(5, 10):
+        assert a.set_item(["foo"], i)
+        assert b.reload()
+        assert b.snapshot().data["foo"] == i
+
+
+def test_shared_invalid(tmp_json_path):
+    def validator(data):
+        return data.get("schema") == 3
+
+    # rejected when loading, like by CachedStorage, and not reloaded by the initial save
+    tmp_json_path.write_text(json.dumps({"schema": 2}))
+    storage = SharedStorage({"schema": 3}, tmp_json_path, validator=validator)
+    assert storage.snapshot().data == {"schema": 3}
+    assert json.loads(tmp_json_path.read_text()) == {"schema": 3}
+
+    tmp_json_path.write_text("{")
+    storage = SharedStorage({"schema": 3, "foo": 1}, tmp_json_path, validator=validator)
+    assert storage.snapshot().data == {"schema": 3, "foo": 1}
+
+    # written by another process, the current data is kept
+    for contents in [json.dumps({"schema": 2}), '{"schema": 3, "fo']:
+        tmp_json_path.write_text(contents)
+        assert not storage.reload()
+        assert storage.set_item(["foo"], 2)
+        assert storage.snapshot().data == {"schema": 3, "foo": 2}
+        storage.set_item(["foo"], 1)
@@ -0,0 +1,15 @@
+from unittest.mock import MagicMock
+from ..views import MaterializedView
+
+
+def test_built_once_until_rebuilt():
+    builder = MagicMock(side_effect=[1, 2])
+    view = MaterializedView(builder)
+
+    assert view.get() == 1
+    assert view.get() == 1
+    builder.assert_called_once()
+
+    view.rebuild()
+    assert view.get() == 2
+    assert builder.call_count == 2
@@ -0,0 +1,39 @@
+"""Derived views on the stored data, computed once and served many times"""
+
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable
+
+
+@dataclass(frozen=True)
+class PrebuiltJson:
+    """Some JSON-serializable data together with its serialized form
+
+    The optional `etag` identifies the version of the data the body was built from.
+    """
+
+    data: Any
+    body: bytes
+    etag: str | None = None
+
+
+class MaterializedView[T]:
+    """Holds the result of an expensive computation until it is explicitly rebuilt.
+
+    Readers get the last built value without taking any lock. A rebuild computes the new value
+    first and then swaps it in, so readers never see a half-built value. The value is shared
+    between all readers and must be treated as read-only.
+    """
+
+    def __init__(self, builder: Callable[[], T]):
+        self._builder = builder
+        self._rebuild_lock = threading.Lock()
+        self._value = builder()
+
+    def get(self) -> T:
+        return self._value
+
+    def rebuild(self):
+        # serialize rebuilds, so an older result can never overwrite a newer one
+        with self._rebuild_lock:
+            self._value = self._builder()
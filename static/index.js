@@ -227,8 +227,40 @@ function resetUtc() {
     updateShowtimeAnnotations();
 }
 
+// time of the last sign of life of the change notices stream
+let lastEventsContact = 0;
+
+function connectEvents() {
+    if (window.EventSource == undefined) {
+        return;
+    }
+
+    const source = new EventSource("events");
+    source.addEventListener("open", () => {
+        lastEventsContact = Date.now();
+    });
+    source.addEventListener("itinerary", event => {
+        lastEventsContact = Date.now();
+        let actKey = JSON.parse(event.data)["act"];
+        updateItineraryView(actKey != null ? actKey : undefined);
+    });
+    source.addEventListener("programme", event => {
+        lastEventsContact = Date.now();
+        let stages = JSON.parse(event.data)["stages"];
+        if (stages == null || stages.includes("AMIGO")) {
+            location.reload();
+        }
+    });
+    source.addEventListener("reset", () => {
+        location.reload();
+    });
+}
+
 function handleMinute() {
-    updateItineraryView();
+    // only poll if we don't get change notices
+    if (Date.now() - lastEventsContact > 2 * 60000) {
+        updateItineraryView();
+    }
     window.setTimeout(handleMinute, 60000);
 }
 
@@ -287,6 +319,8 @@ function onLoad() {
     });
 
     showCurrentDay();
+    updateItineraryView();
+    connectEvents();
     handleMinute();
     handleSecond();
     handleMirrorAnimation();
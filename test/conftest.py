@@ -1,16 +1,23 @@
 """Common fixtures"""
 
+import json
 import subprocess
 from contextlib import contextmanager
 from pathlib import Path
 import shutil
 import time
 import os
+import sys
 
 import pytest
 import requests
 import urllib.parse
 import bs4
+from flask import Flask
+from flask.testing import FlaskClient
+
+from app import create_app
+from .upstream import UpstreamStandIn
 
 
 TEST_DIR = Path(__file__).parent
@@ -64,12 +71,69 @@ def _start_app_python(tmp_path: Path, virgin=False):
         ],
         cwd=ROOT_DIR,
     ) as p:
-        time.sleep(3)
-        assert p.poll() is None
+        wait_until_ready("http://localhost:5000", p)
         yield
         p.kill()
 
 
+def wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 30):
+    """Waits until the app at `url` answers requests, fails if `process` exits or it times out"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            requests.get(f"{url}/login", timeout=1)
+            return
+        except (requests.ConnectionError, requests.Timeout):
+            assert process.poll() is None, f"app exited with {process.returncode}"
+            assert time.monotonic() < deadline, f"app not ready after {timeout} s"
+            time.sleep(0.1)
+
+
+@contextmanager
+def start_app_waitress(
+    instance_path: Path, port: int, threads: int = 8, config: Path | None = None
+):
+    """Start app using waitress, like the Docker image does, e.g. for benchmarks and load tests.
+
+    Yields the app's URL once it accepts requests.
+    """
+    config = (config or TEST_DIR / "settings.py").absolute()
+    code = (
+        "from waitress import serve\n"
+        "from app import create_app\n"
+        f"app = create_app(instance_path={str(instance_path)!r}, config_filename={str(config)!r})\n"
+        f"serve(app, port={port}, threads={threads}, connection_limit=1000)\n"
+    )
+    url = f"http://localhost:{port}"
+    with subprocess.Popen([sys.executable, "-c", code], cwd=ROOT_DIR) as p:
+        # large instance data takes a while to load
+        wait_until_ready(url, p, timeout=60)
+        yield url
+        p.kill()
+
+
+def make_local_app(tmp_path: Path, **settings) -> Flask:
+    """Create the app in-process, on a copy of the test instance in `tmp_path / "instance"`.
+
+    `settings` are added to the test settings.
+    """
+    instance = tmp_path / "instance"
+    shutil.copytree(INSTANCE_DIR, instance)
+    config = tmp_path / "settings.py"
+    config.write_text(
+        (TEST_DIR / "settings.py").read_text()
+        + "".join(f"{name} = {value!r}\n" for name, value in settings.items())
+    )
+    app = create_app(instance_path=instance, config_filename=config)
+    app.config.update(WTF_CSRF_ENABLED=False)
+    return app
+
+
+def login(client: FlaskClient) -> FlaskClient:
+    client.post("/login", data={"username": "test", "password": "test", "submit": "Submit"})
+    return client
+
+
 @contextmanager
 def _start_app_docker(tmp_path: Path, docker_image: str, virgin=False):
     """Start app using Docker container."""
@@ -83,6 +147,9 @@ def _start_app_docker(tmp_path: Path, docker_image: str, virgin=False):
     
     config_file = TEST_DIR / "settings.py"
     shutil.copy(config_file, instance_data_dir / "settings.py")
+    # the event streams need a port which is published
+    with open(instance_data_dir / "settings.py", "a") as f:
+        f.write('EVENTS_PORT = 8081\nEVENTS_URL = "http://localhost:5002/events"\n')
     
     os.chmod(instance_data_dir, 0o777)
     for root, dirs, files in os.walk(instance_data_dir):
@@ -101,6 +168,8 @@ def _start_app_docker(tmp_path: Path, docker_image: str, virgin=False):
             container_name,
             "-p",
             "5001:8080",
+            "-p",
+            "5002:8081",
             "-e",
             "HOST=0.0.0.0",
             "-v",
@@ -214,3 +283,26 @@ def session(host, app):
 @pytest.fixture
 def session_virgin(host, app_virgin):
     return create_session(host)
+
+
+@pytest.fixture
+def client(local_app):
+    """Logged in test client of the `local_app` fixture of the test module"""
+    return login(local_app.test_client())
+
+
+@pytest.fixture
+def stand_in(tmp_path):
+    recording = tmp_path / "recording"
+    recording.mkdir()
+    shutil.copy(INSTANCE_DIR / "acts.json", recording / "acts.json")
+    programs = [
+        {"id": 10, "title": "Foo", "description": "<p>foo</p>", "location": {"id": 1}},
+        {"id": 11, "title": "Bar", "description": "<p>bar</p>", "location": {"id": 1}},
+    ]
+    (recording / "programs.json").write_text(json.dumps(programs))
+    (recording / "locations.json").write_text(json.dumps([{"id": 1, "title": "Amigo"}]))
+    stand_in = UpstreamStandIn(recording)
+    stand_in.url = stand_in.start()
+    yield stand_in
+    stand_in.stop()
@@ -2,3 +2,5 @@ USERNAME = "test"
 PASSWORD = "test"
 UPDATE_PROGRAMME = False
 ZPF_API_URL = ""
+EVENTS_HOLD_SECONDS = 1
+EVENTS_PORT = 0
@@ -0,0 +1,234 @@
+"""Concurrency tests, running the app in-process"""
+
+import copy
+import gzip
+import itertools
+import json
+import threading
+import time
+from pathlib import Path
+
+import pytest
+import responses
+
+from src import storage
+
+from .conftest import INSTANCE_DIR, login, make_local_app
+
+ACTS_URL = "https://planner.fake/acts"
+
+
+# storage backends of the itinerary, for the tests which are about storing
+BACKENDS = ["json", "journal", "sqlite"]
+
+
+@pytest.fixture
+def backend():
+    """Storage backend of the itinerary, parametrize with `BACKENDS` to test all of them"""
+    return "json"
+
+
+@pytest.fixture
+def local_app(tmp_path, request, backend):
+    if request.config.use_docker_app:
+        pytest.skip("runs the app in-process")
+    return make_local_app(
+        tmp_path,
+        STORAGE_BACKENDS={"itinerary": backend},
+        JOURNAL_COMPACT_BYTES=1024,
+        ACTS_URL=ACTS_URL,
+        ACTS_USERNAME="test",
+        ACTS_PASSWORD="test",
+    )
+
+
+@pytest.fixture
+def planner():
+    """Production planner which moves a show on every fetch"""
+    with open(INSTANCE_DIR / "acts.json") as f:
+        acts = json.load(f)
+    counter = itertools.count()
+
+    def callback(request):
+        minute = next(counter) % 60
+        changed = copy.deepcopy(acts)
+        changed[0]["timeline"][-1]["start"] = f"2025-08-09 22:{minute:02}:00"
+        return 200, {}, json.dumps(changed)
+
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        rsps.add_callback(responses.GET, ACTS_URL, callback=callback)
+        yield rsps
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_endpoints_and_jobs_in_parallel(local_app, planner):
+    jobs = local_app.extensions["ingest_jobs"]
+    errors = []
+    stop = threading.Event()
+
+    def read():
+        client = login(local_app.test_client())
+        for url in ["/", "/programme", "/programme.ics", "/itinerary", "/itinerary/foo"]:
+            response = client.get(url)
+            assert response.status_code == 200, url
+            response.close()
+
+    def edit():
+        client = login(local_app.test_client())
+        for room in ["1", "2", "3"]:
+            response = client.put("/itinerary/foo/dressing_room", data=room)
+            assert response.status_code == 200
+
+    def loop(function):
+        try:
+            while not stop.is_set():
+                function()
+        except Exception as e:
+            errors.append(e)
+
+    functions = [read] * 4 + [edit] * 2 + [jobs["update_acts"], jobs["update_act_descriptions"]]
+    threads = [threading.Thread(target=loop, args=[function]) for function in functions]
+    for thread in threads:
+        thread.start()
+    time.sleep(2)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=30)
+        assert not thread.is_alive(), "deadlock"
+
+    assert not errors
+    assert len(planner.calls) > 1
+    itinerary = local_app.test_client().get("/itinerary").json
+    assert itinerary["foo"]["dressing_room"] in ["1", "2", "3"]
+
+
+def test_reads_not_blocked_by_writer(local_app, planner, monkeypatch):
+    """Requests which only read keep being served while an ingest job holds the storage locks"""
+    write_started = threading.Event()
+    reads_done = threading.Event()
+    write_atomically = storage.write_atomically
+
+    def slow_write_atomically(*args, **kwargs):
+        # e.g. a slow disk, while update_acts holds the locks of the acts and the itinerary
+        write_started.set()
+        assert reads_done.wait(timeout=30)
+        write_atomically(*args, **kwargs)
+
+    monkeypatch.setattr(storage, "write_atomically", slow_write_atomically)
+    writer = threading.Thread(target=local_app.extensions["ingest_jobs"]["update_acts"])
+    writer.start()
+    assert write_started.wait(timeout=10)
+
+    def read(results: list[int]):
+        client = login(local_app.test_client())
+        for _ in range(5):
+            for url in ["/", "/programme", "/programme.ics", "/itinerary", "/itinerary/foo"]:
+                results.append(client.get(url).status_code)
+
+    results = [[] for _ in range(4)]
+    readers = [threading.Thread(target=read, args=[result]) for result in results]
+    for thread in readers:
+        thread.start()
+    for thread in readers:
+        thread.join(timeout=10)
+    # the readers got through before the write was let go
+    blocked = [thread for thread in readers if thread.is_alive()]
+    writing = writer.is_alive()
+    reads_done.set()
+    writer.join(timeout=10)
+    assert not blocked and writing
+    assert all(result == [200] * 25 for result in results)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_unchanged_acts_not_saved(local_app, client):
+    with open(INSTANCE_DIR / "acts.json") as f:
+        acts = json.load(f)
+    with responses.RequestsMock() as rsps:
+        rsps.get(ACTS_URL, json=acts)
+        rsps.get(ACTS_URL, json=acts[1:])
+        etag = client.get("/programme").headers["ETag"]
+        mtime = (Path(local_app.instance_path) / "acts.json").stat().st_mtime_ns
+        local_app.extensions["ingest_jobs"]["update_acts"]()
+        assert client.get("/programme").headers["ETag"] == etag
+        assert (Path(local_app.instance_path) / "acts.json").stat().st_mtime_ns == mtime
+
+        local_app.extensions["ingest_jobs"]["update_acts"]()
+        assert client.get("/programme").headers["ETag"] != etag
+
+
+def test_index_cached(local_app, client, monkeypatch):
+    import app
+
+    rendered = []
+    render_template = app.render_template
+
+    def counting_render_template(*args, **kwargs):
+        rendered.append(args[0])
+        return render_template(*args, **kwargs)
+
+    monkeypatch.setattr(app, "render_template", counting_render_template)
+    with open(INSTANCE_DIR / "acts.json") as f:
+        acts = json.load(f)
+    rendered.clear()
+
+    first = client.get("/").data
+    assert client.get("/").data == first
+    assert client.get("/?devMode").data != first
+    assert rendered == ["index.html"] * 2
+
+    # rendered in the background after a change
+    with responses.RequestsMock() as rsps:
+        rsps.get(ACTS_URL, json=acts[1:])
+        local_app.extensions["ingest_jobs"]["update_acts"]()
+    for thread in threading.enumerate():
+        if thread.name == "prerender_index":
+            thread.join()
+    assert len(rendered) == 3
+    assert b"Foo" not in client.get("/").data
+    assert len(rendered) == 3
+
+
+def test_compressed_once(local_app, monkeypatch):
+    from src import compression
+
+    compressed = []
+    gzip_compress = compression.COMPRESSORS["gzip"]
+
+    def counting_gzip_compress(body):
+        compressed.append(body)
+        return gzip_compress(body)
+
+    monkeypatch.setitem(compression.COMPRESSORS, "gzip", counting_gzip_compress)
+    with open(INSTANCE_DIR / "acts.json") as f:
+        acts = json.load(f)
+    client = local_app.test_client()
+    headers = {"Accept-Encoding": "gzip"}
+
+    plain = client.get("/programme")
+    first = client.get("/programme", headers=headers)
+    assert first.headers["Content-Encoding"] == "gzip"
+    assert len(first.data) < len(plain.data)
+    assert gzip.decompress(first.data) == plain.data
+    assert client.get("/programme", headers=headers).data == first.data
+    assert compressed == [plain.data]
+
+    # compressed again only after a change
+    with responses.RequestsMock() as rsps:
+        rsps.get(ACTS_URL, json=acts[1:])
+        local_app.extensions["ingest_jobs"]["update_acts"]()
+    changed = client.get("/programme", headers=headers)
+    assert gzip.decompress(changed.data) == client.get("/programme").data
+    client.get("/programme", headers=headers)
+    assert len(compressed) == 2
+
+
+def test_compressed_per_host(local_app):
+    client = local_app.test_client()
+    for host in ["host-a", "host-b"]:
+        plain = client.get("/programme.ics", base_url=f"http://{host}")
+        compressed = client.get(
+            "/programme.ics", base_url=f"http://{host}", headers={"Accept-Encoding": "gzip"}
+        )
+        assert f"@{host}".encode() in plain.data
+        assert gzip.decompress(compressed.data) == plain.data
@@ -0,0 +1,86 @@
+"""Tests of matching acts to the festival website, running the app in-process"""
+
+import pytest
+import responses
+
+import zpfwebsite
+from .conftest import make_local_app
+
+WEBSITE_URL = "https://website.fake"
+
+
+@pytest.fixture
+def local_app(tmp_path, request):
+    if request.config.use_docker_app:
+        pytest.skip("runs the app in-process")
+    return make_local_app(tmp_path, ZPF_API_URL=WEBSITE_URL, WEBSITE_CACHE_SECONDS=0)
+
+
+@pytest.fixture
+def programs():
+    return [
+        {"id": 10, "title": "Foo", "description": "<p>foo</p>", "location": {"id": 1}},
+        {"id": 11, "title": "Bar", "description": "<p>bar</p>", "location": {"id": 1}},
+        {"id": 12, "title": "Mixx", "description": "<p>mix</p>", "location": {"id": 1}},
+    ]
+
+
+@pytest.fixture
+def website(programs):
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        rsps.get(f"{WEBSITE_URL}/locations", json=[{"id": 1, "title": "Amigo"}])
+        rsps.get(f"{WEBSITE_URL}/programs", json=programs)
+        yield rsps
+
+
+@pytest.fixture
+def matcher_calls(monkeypatch):
+    calls = []
+
+    class ProgramMatcher(zpfwebsite.ProgramMatcher):
+        def match_all(self, titles):
+            titles = list(titles)
+            calls.append(titles)
+            return super().match_all(titles)
+
+    monkeypatch.setattr(zpfwebsite, "ProgramMatcher", ProgramMatcher)
+    return calls
+
+
+def test_matches_kept(local_app, client, website, programs, matcher_calls):
+    update_act_descriptions = local_app.extensions["ingest_jobs"]["update_act_descriptions"]
+    update_act_descriptions()
+    assert matcher_calls == [["Foo", "Bar", "Mix"]]
+    matches = client.get("/matches").json
+    assert matches["foo"] == {"program": 10, "name": "Foo", "score": 1.0, "pinned": False}
+    assert matches["mix"]["program"] == 12
+    assert client.get("/programme").json["acts"]["foo"]["description"] == "foo"
+
+    # descriptions are refreshed without matching again
+    programs[0]["description"] = "<p>new</p>"
+    website.replace(responses.GET, f"{WEBSITE_URL}/programs", json=programs)
+    update_act_descriptions()
+    assert len(matcher_calls) == 1
+    assert client.get("/programme").json["acts"]["foo"]["description"] == "new"
+
+
+def test_pin_match(local_app, client, website, matcher_calls):
+    update_act_descriptions = local_app.extensions["ingest_jobs"]["update_act_descriptions"]
+    response = client.put("/matches/foo", data="11")
+    assert response.status_code == 200
+    assert response.json["pinned"]
+
+    update_act_descriptions()
+    assert matcher_calls == [["Bar", "Mix"]]
+    assert client.get("/programme").json["acts"]["foo"]["description"] == "bar"
+
+    # unpinning makes it match automatically again
+    assert client.put("/matches/foo", data="").status_code == 200
+    update_act_descriptions()
+    assert matcher_calls[-1] == ["Foo"]
+    assert client.get("/programme").json["acts"]["foo"]["description"] == "foo"
+
+
+def test_pin_match_invalid(client):
+    assert client.put("/matches/nonexistent", data="11").status_code == 404
+    assert client.put("/matches/foo", data="eleven").status_code == 400
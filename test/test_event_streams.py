@@ -0,0 +1,51 @@
+"""Tests of the event streams when served by waitress, like in production"""
+
+import shutil
+import socket
+from contextlib import ExitStack
+from urllib.parse import urlsplit
+
+import pytest
+import requests
+
+from .conftest import INSTANCE_DIR, TEST_DIR, create_session, start_app_waitress
+
+THREADS = 4
+STREAMS = 150
+
+
+@pytest.fixture
+def waitress_host(tmp_path, request):
+    if request.config.use_docker_app:
+        pytest.skip("runs the app with waitress")
+    instance = tmp_path / "instance"
+    shutil.copytree(INSTANCE_DIR, instance)
+    settings = tmp_path / "settings.py"
+    settings.write_text((TEST_DIR / "settings.py").read_text() + "EVENTS_HOLD_SECONDS = None\n")
+    with start_app_waitress(instance, 5006, threads=THREADS, config=settings) as url:
+        yield url
+
+
+def test_many_streams(waitress_host):
+    """Every client keeps its stream, far more than there are threads"""
+    location = requests.get(f"{waitress_host}/events", allow_redirects=False).headers["Location"]
+    events_url = urlsplit(location)
+    with ExitStack() as stack:
+        streams = []
+        for _ in range(STREAMS):
+            sock = stack.enter_context(
+                socket.create_connection((events_url.hostname, events_url.port), timeout=10)
+            )
+            sock.sendall(f"GET {events_url.path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+            streams.append(sock.makefile("rb"))
+            stack.callback(streams[-1].close)
+        for stream in streams:
+            assert stream.readline().startswith(b"HTTP/1.1 200 ")
+
+        # the app is still responsive
+        session = create_session(waitress_host)
+        session.put("itinerary/foo/dressing_room", data="Room 42".encode("utf-8"))
+
+        for stream in streams:
+            while (line := stream.readline()) != b"event: itinerary\n":
+                assert line, "stream closed"
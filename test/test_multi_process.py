@@ -0,0 +1,83 @@
+"""Tests of several waitress processes serving the same instance folder"""
+
+import shutil
+import time
+from contextlib import ExitStack
+
+import pytest
+import requests
+
+from .conftest import INSTANCE_DIR, TEST_DIR, create_session, start_app_waitress
+
+
+def wait_for(condition, seconds: float = 10) -> bool:
+    deadline = time.monotonic() + seconds
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.1)
+    return True
+
+
+@pytest.fixture
+def hosts(tmp_path, request, stand_in):
+    if request.config.use_docker_app:
+        pytest.skip("runs several app processes")
+    instance = tmp_path / "instance"
+    shutil.copytree(INSTANCE_DIR, instance)
+    settings = tmp_path / "settings.py"
+    settings.write_text(
+        (TEST_DIR / "settings.py").read_text()
+        + "MULTI_PROCESS = True\n"
+        + "MULTI_PROCESS_CHECK_SECONDS = 0.1\n"
+        + "UPDATE_PROGRAMME = True\n"
+        + f"ACTS_URL = {stand_in.url + '/acts'!r}\n"
+        + "ACTS_USERNAME = 'test'\n"
+        + "ACTS_PASSWORD = 'test'\n"
+        + f"ZPF_API_URL = {stand_in.url!r}\n"
+        + "HTTP_RETRIES = 0\n"
+    )
+    with ExitStack() as stack:
+        yield [
+            stack.enter_context(start_app_waitress(instance, port, config=settings))
+            for port in [5004, 5005]
+        ]
+
+
+def test_multi_process(hosts, stand_in):
+    first, second = hosts
+
+    # only one of the processes runs the ingest jobs
+    assert wait_for(lambda: "/acts" in stand_in.requests)
+    time.sleep(1)
+    assert stand_in.requests.count("/acts") == 1
+
+    def dressing_room(host: str, key: str) -> str:
+        return requests.get(f"{host}/itinerary", timeout=5).json()[key]["dressing_room"]
+
+    create_session(first).put("itinerary/foo/dressing_room", data="Room 42".encode("utf-8"))
+    assert wait_for(lambda: dressing_room(second, "foo") == "Room 42")
+
+    # a change in the other process keeps the first one
+    create_session(second).put("itinerary/bar/dressing_room", data="Room 43".encode("utf-8"))
+    assert wait_for(lambda: dressing_room(first, "bar") == "Room 43")
+    assert dressing_room(first, "foo") == "Room 42"
+
+    # so clients can switch processes without downloading everything again
+    assert wait_for(
+        lambda: len({requests.get(f"{host}/programme").headers["ETag"] for host in hosts}) == 1
+    )
+    etag = requests.get(f"{first}/programme").headers["ETag"]
+    response = requests.get(f"{second}/programme", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_pin_match_multi_process(hosts):
+    def description(host: str) -> str:
+        return requests.get(f"{host}/programme", timeout=5).json()["acts"]["foo"]["description"]
+
+    # one of them doesn't run the ingest jobs, and leaves the descriptions to the other one
+    for host, program, expected in [(hosts[0], "11", "bar"), (hosts[1], "10", "foo")]:
+        response = create_session(host).put("matches/foo", data=program)
+        assert response.status_code == 200
+        assert wait_for(lambda: all(description(host) == expected for host in hosts))
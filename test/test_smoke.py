@@ -1,5 +1,7 @@
 """Smoke tests"""
 
+import json
+
 from icalendar import Calendar
 
 
@@ -16,6 +18,18 @@ def test_programme(session):
     assert "baz" not in acts  # different stage
 
 
+def test_programme_query(session):
+    acts = session.get("programme", params={"stage": "main"}).json()["acts"]
+    assert set(acts) == {"mix", "baz"}
+    assert acts["mix"]["shows"][0]["stage"] == "MAIN"
+
+    acts = session.get("programme", params={"stage": "Amigo", "day": "zaterdag"}).json()["acts"]
+    assert list(acts) == ["foo"]
+    assert acts["foo"]["description"] == "Description of Foo"
+
+    assert session.get("programme", params={"day": "someday"}).status_code == 400
+
+
 def test_itinerary(session):
     itinerary = session.get("itinerary").json()
     assert itinerary["foo"]["dressing_room"] == "Room 1"
@@ -43,6 +57,130 @@ def test_icalendar(session):
     assert "Bar" in act_names
 
 
+def test_icalendar_stage(session):
+    calendar = Calendar.from_ical(session.get("programme.ics", params={"stage": "main"}).text)
+    assert sorted(event.get("SUMMARY") for event in calendar.events) == ["Baz", "Mix"]
+
+
 def test_icalendar_virgin(session_virgin):
     calendar = Calendar.from_ical(session_virgin.get("programme.ics").text)
     assert len(calendar.events) == 0
+
+
+def test_conditional_get(session):
+    for url in ["/", "programme", "programme.ics", "itinerary", "itinerary/foo"]:
+        response = session.get(url)
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+
+        response = session.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+
+        # also when not compressed
+        response = session.get(url, headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+        assert response.status_code == 304
+
+    itinerary_etag = session.get("itinerary").headers["ETag"]
+    session.put("itinerary/foo/dressing_room", data="Room 42".encode("utf-8"))
+
+    response = session.get("itinerary", headers={"If-None-Match": itinerary_etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != itinerary_etag
+    assert response.json()["foo"]["dressing_room"] == "Room 42"
+
+
+def parse_event_stream(text: str) -> list[dict[str, str]]:
+    messages = []
+    for block in text.split("\n\n"):
+        fields = dict(line.split(": ", maxsplit=1) for line in block.splitlines())
+        if fields:
+            messages.append(fields)
+    return messages
+
+
+def test_events(session):
+    response = session.get("events")
+    assert response.headers["Content-Type"].startswith("text/event-stream")
+    last_id = parse_event_stream(response.text)[-1]["id"]
+
+    session.put("itinerary/foo/dressing_room", data="Room 42".encode("utf-8"))
+
+    response = session.get("events", headers={"Last-Event-ID": last_id})
+    events = [message for message in parse_event_stream(response.text) if "event" in message]
+    assert events[0]["event"] == "itinerary"
+    assert json.loads(events[0]["data"])["act"] == "foo"
+
+    # unknown ID (e.g. from before a restart)
+    response = session.get("events", headers={"Last-Event-ID": "1"})
+    assert parse_event_stream(response.text)[-1]["event"] == "reset"
+
+
+def test_changes(session):
+    # unknown ID (e.g. from before a restart)
+    full = session.get("changes?since=1").json()
+    assert full["full"]
+    assert "foo" in full["programme"] and "foo" in full["itinerary"]
+
+    session.put("itinerary/foo/dressing_room", data="Room 43".encode("utf-8"))
+
+    changes = session.get(f"changes?since={full['id']}").json()
+    assert not changes["full"]
+    assert changes["programme"] == {}
+    assert changes["itinerary"] == {"foo": full["itinerary"]["foo"] | {"dressing_room": "Room 43"}}
+
+    unchanged = session.get(f"changes?since={changes['id']}").json()
+    assert unchanged == {"id": changes["id"], "full": False, "programme": {}, "itinerary": {}}
+
+
+def test_changes_invalid(session):
+    assert session.get("changes").status_code == 400
+    assert session.get("changes?since=foo").status_code == 400
+
+
+def test_compression(session):
+    for url in ["programme", "programme.ics", "itinerary", "static/index.js"]:
+        compressed = session.get(url, headers={"Accept-Encoding": "gzip"})
+        assert compressed.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in compressed.headers["Vary"]
+        plain = session.get(url, headers={"Accept-Encoding": "identity"})
+        assert "Content-Encoding" not in plain.headers
+        assert compressed.content == plain.content
+        assert int(compressed.headers["Content-Length"]) < len(plain.content)
+
+
+def test_icalendar_deterministic(session):
+    url = "programme.ics?reminders=start_utc.-10;end_utc.-5"
+    first = session.get(url).text
+    assert session.get(url).text == first
+
+    calendar = Calendar.from_ical(first)
+    alarm_uids = [alarm.get("UID") for event in calendar.events for alarm in event.subcomponents]
+    assert len(alarm_uids) == len(set(alarm_uids)) > 0
+
+
+def test_icalendar_invalid_reminder(session):
+    assert session.get("programme.ics?reminders=start_utc.foo").status_code == 400
+    assert session.get("programme.ics?reminders=nonexistent.-5").status_code == 400
+
+
+def test_itinerary_batch(session):
+    before = session.get("itinerary").json()
+    updates = {"foo": {"dressing_room": "Room 44"}, "bar": {"dressing_room": "Room 45"}}
+    response = session.patch("itinerary", json=updates)
+    assert response.status_code == 200
+    assert response.json() == {
+        "foo": before["foo"] | {"dressing_room": "Room 44"},
+        "bar": before["bar"] | {"dressing_room": "Room 45"},
+    }
+    assert session.get("itinerary").json() == before | response.json()
+
+    # nothing is set if anything is invalid
+    for invalid, status in [
+        ({"foo": {"dressing_room": "Room 46"}, "nonexistent": {"dressing_room": "Room 1"}}, 404),
+        ({"foo": {"dressing_room": "Room 46"}, "bar": {"soundcheck": "12:00"}}, 405),
+        ({"foo": {"dressing_room": 46}}, 400),
+        (["foo"], 400),
+    ]:
+        assert session.patch("itinerary", json=invalid).status_code == status
+    assert session.get("itinerary/foo").json()["dressing_room"] == "Room 44"
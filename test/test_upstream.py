@@ -0,0 +1,61 @@
+"""Tests of the ingest jobs against the upstream stand-in, running the app in-process"""
+
+import pytest
+import requests
+
+from .conftest import make_local_app
+from .upstream import Faults
+
+
+@pytest.fixture
+def local_app(tmp_path, request, stand_in):
+    if request.config.use_docker_app:
+        pytest.skip("runs the app in-process")
+    return make_local_app(
+        tmp_path,
+        ACTS_URL=stand_in.url + "/acts",
+        ACTS_USERNAME="test",
+        ACTS_PASSWORD="test",
+        ZPF_API_URL=stand_in.url,
+        WEBSITE_CACHE_SECONDS=0,
+        HTTP_RETRIES=0,
+        HTTP_READ_TIMEOUT=0.5,
+    )
+
+
+def test_replay(local_app, stand_in):
+    jobs = local_app.extensions["ingest_jobs"]
+    client = local_app.test_client()
+    jobs["update_acts"]()
+    jobs["update_act_descriptions"]()
+    assert client.get("/programme").json["acts"]["bar"]["description"] == "bar"
+
+    # the ETag of a programme slice changes with any change of the acts
+    etag = client.get("/programme?day=zaterdag").headers["ETag"]
+    stand_in.mutate()
+    jobs["update_acts"]()
+    assert client.get("/programme?day=zaterdag").headers["ETag"] != etag
+
+
+@pytest.mark.parametrize(
+    "faults, error",
+    [
+        (Faults(error_rate=1), requests.HTTPError),
+        (Faults(partial_rate=1), requests.RequestException),
+        # without retries, urllib3 reports timeouts as connection errors
+        (Faults(timeout_rate=1, hang=2), requests.ConnectionError),
+    ],
+)
+def test_faults(local_app, stand_in, faults, error):
+    client = local_app.test_client()
+    before = client.get("/programme").data
+    stand_in.faults = faults
+    with pytest.raises(error):
+        local_app.extensions["ingest_jobs"]["update_acts"]()
+    assert client.get("/programme").data == before
+
+
+def test_latency(local_app, stand_in):
+    stand_in.faults = Faults(latency=0.1)
+    local_app.extensions["ingest_jobs"]["update_acts"]()
+    assert stand_in.requests == ["/acts"]
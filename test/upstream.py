@@ -0,0 +1,249 @@
+"""Stand-in for the upstream services: the production planner's acts feed and the website API
+
+Replays payloads from a directory (`acts.json`, `programs.json` and `locations.json`), which are
+recorded from the real services with `record`, or generated with `benchmark.festival_data`. To
+exercise the ingest jobs under bad conditions, it can inject latency, requests which hang, 5xx
+errors and bodies which are cut off, and move shows around over time like the planners do.
+
+    python -m test.upstream record <directory> --acts-url ... --username ... --website-url ...
+    python -m test.upstream serve <directory> --port 5010 --latency 0.5 --error-rate 0.1
+
+and point `ACTS_URL` to http://localhost:5010/acts and `ZPF_API_URL` to http://localhost:5010.
+"""
+
+import argparse
+import copy
+import datetime
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+
+# URL path and file name of the payloads
+PAYLOADS = {"/acts": "acts.json", "/programs": "programs.json", "/locations": "locations.json"}
+
+_logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Faults:
+    """What goes wrong, the rates are the fractions of requests they happen to"""
+
+    # seconds added to every response, plus a random part of up to `jitter` seconds
+    latency: float = 0
+    jitter: float = 0
+    # requests which only get their response after `hang` seconds, i.e. usually time out
+    timeout_rate: float = 0
+    hang: float = 60
+    error_rate: float = 0
+    # responses which are cut off halfway, with the connection closed
+    partial_rate: float = 0
+    # every so many seconds one act is rescheduled, see `UpstreamStandIn.mutate`
+    mutate_interval: float | None = None
+
+
+class UpstreamStandIn:
+    """Serves the payloads in `directory`, with `faults`, on localhost
+
+    The payloads are kept in memory, so mutations don't change the recording. The website's
+    endpoints answer conditional requests like the real website does. All randomness comes from
+    `seed`, so runs can be repeated.
+    """
+
+    def __init__(self, directory: Path, faults: Faults | None = None, seed: int = 42):
+        self.faults = faults or Faults()
+        self._payloads = {}
+        for path, file in PAYLOADS.items():
+            if (directory / file).exists():
+                self._payloads[path] = json.loads((directory / file).read_text())
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._last_mutation = time.monotonic()
+        self._server: ThreadingHTTPServer | None = None
+        # paths of the requests, in order
+        self.requests: list[str] = []
+
+    def start(self, port: int = 0) -> str:
+        """Serves in a background thread, returns the URL (of a free port if `port` is 0)"""
+        self._server = ThreadingHTTPServer(("localhost", port), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://localhost:{self._server.server_port}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def mutate(self):
+        """Reschedules a random act, by moving its whole timeline 5 to 30 minutes"""
+        with self._lock:
+            acts = self._payloads["/acts"]
+            act = self._rng.choice(acts)
+            shift = datetime.timedelta(
+                minutes=self._rng.choice([-1, 1]) * self._rng.randint(1, 6) * 5
+            )
+            for event in act["timeline"]:
+                for field in ["start", "end"]:
+                    moved = datetime.datetime.fromisoformat(event[field]) + shift
+                    event[field] = moved.strftime("%Y-%m-%d %H:%M:%S")
+            _logger.info(f"moved {act['name']} by {shift}")
+
+    @property
+    def paths(self) -> list[str]:
+        """The URL paths which have a payload"""
+        return list(self._payloads)
+
+    def payload(self, path: str):
+        """The data currently served at `path`"""
+        with self._lock:
+            return copy.deepcopy(self._payloads[path])
+
+    def _mutate_if_due(self):
+        interval = self.faults.mutate_interval
+        if interval is None or "/acts" not in self._payloads:
+            return
+        while True:
+            with self._lock:
+                if time.monotonic() - self._last_mutation < interval:
+                    return
+                self._last_mutation += interval
+            self.mutate()
+
+    def _draw(self) -> tuple[float, float]:
+        """The random delay and fault choice of a request"""
+        with self._lock:
+            return self._rng.random() * self.faults.jitter, self._rng.random()
+
+    def _body(self, path: str) -> bytes:
+        with self._lock:
+            return json.dumps(self._payloads[path]).encode("utf-8")
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                stand_in.requests.append(path)
+                stand_in._mutate_if_due()
+                faults = stand_in.faults
+                jitter, choice = stand_in._draw()
+                time.sleep(faults.latency + jitter)
+
+                if path not in stand_in._payloads:
+                    self._send(404, b"not found")
+                    return
+                if choice < faults.timeout_rate:
+                    time.sleep(faults.hang)
+                elif choice < faults.timeout_rate + faults.error_rate:
+                    self._send(503, b"service unavailable")
+                    return
+
+                body = stand_in._body(path)
+                etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+                if path != "/acts" and self.headers.get("If-None-Match") == etag:
+                    self._send(304, b"", {"ETag": etag})
+                    return
+                partial = (
+                    faults.timeout_rate + faults.error_rate
+                    <= choice
+                    < faults.timeout_rate + faults.error_rate + faults.partial_rate
+                )
+                headers = {"Content-Type": "application/json"}
+                if path != "/acts":
+                    headers["ETag"] = etag
+                self._send(200, body, headers, partial=partial)
+
+            def _send(self, status: int, body: bytes, headers: dict | None = None, partial=False):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if partial:
+                    self.wfile.write(body[: len(body) // 2])
+                    self.close_connection = True
+                else:
+                    self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                _logger.debug(format % args)
+
+        return Handler
+
+
+def record(directory: Path, acts_url: str, username: str, password: str, website_url: str):
+    """Saves the current payloads of the real services to `directory`"""
+    directory.mkdir(parents=True, exist_ok=True)
+    sources = [
+        ("acts.json", acts_url, requests.auth.HTTPBasicAuth(username, password)),
+        ("programs.json", f"{website_url}/programs", None),
+        ("locations.json", f"{website_url}/locations", None),
+    ]
+    for file, url, auth in sources:
+        response = requests.get(url, auth=auth, timeout=60)
+        response.raise_for_status()
+        (directory / file).write_text(json.dumps(response.json(), indent=2))
+        print(f"recorded {url} to {directory / file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    recorder = commands.add_parser("record", help="record the payloads of the real services")
+    recorder.add_argument("directory", type=Path)
+    recorder.add_argument("--acts-url", required=True)
+    recorder.add_argument("--username", required=True)
+    recorder.add_argument("--password", required=True)
+    recorder.add_argument("--website-url", required=True)
+    server = commands.add_parser("serve", help="replay recorded payloads")
+    server.add_argument("directory", type=Path)
+    server.add_argument("--port", type=int, default=5010)
+    server.add_argument("--seed", type=int, default=42)
+    server.add_argument("--latency", type=float, default=0, help="seconds")
+    server.add_argument("--jitter", type=float, default=0, help="seconds")
+    server.add_argument("--timeout-rate", type=float, default=0)
+    server.add_argument("--hang", type=float, default=60, help="seconds")
+    server.add_argument("--error-rate", type=float, default=0)
+    server.add_argument("--partial-rate", type=float, default=0)
+    server.add_argument("--mutate-interval", type=float, help="seconds")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.directory, args.acts_url, args.username, args.password, args.website_url)
+        return
+
+    logging.basicConfig(level=logging.INFO)
+    faults = Faults(
+        latency=args.latency,
+        jitter=args.jitter,
+        timeout_rate=args.timeout_rate,
+        hang=args.hang,
+        error_rate=args.error_rate,
+        partial_rate=args.partial_rate,
+        mutate_interval=args.mutate_interval,
+    )
+    stand_in = UpstreamStandIn(args.directory, faults, args.seed)
+    url = stand_in.start(args.port)
+    print(f"serving {', '.join(stand_in.paths)} at {url}, stop with Ctrl+C")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stand_in.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1 @@
-from .api import Api, find_best_matching_program
+from .api import Api, ProgramMatcher, find_best_matching_program
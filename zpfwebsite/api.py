@@ -1,7 +1,15 @@
+import bisect
+import hashlib
+import json
+import math
+import os
+import threading
+import time
 import requests
 import logging
+from dataclasses import asdict, dataclass
 from difflib import SequenceMatcher
-from typing import Any
+from typing import Any, Iterable
 
 from unidecode import unidecode
 
@@ -13,51 +21,184 @@ def find_best_matching_program(
 
     Returns the best matching program if its similarity score is 0.8 or higher, otherwise
     raises `ValueError`. When `remove_diacritics` is True, diacritics are removed from both
-    the search title and program titles before comparison.
+    the search title and program titles before comparison. To match many titles, use
+    `ProgramMatcher`.
     """
+    return ProgramMatcher(programs, remove_diacritics).find(title)
 
-    def ratio(program: dict[str, Any]) -> float:
-        a, b = title, program["title"]
-        if remove_diacritics:
-            a, b = unidecode(a), unidecode(b)
-        return SequenceMatcher(None, a.lower(), b.lower()).ratio()
 
-    best = max(programs, key=ratio)
-    if ratio(best) < 0.8:
-        raise ValueError(f"could not match '{title}' to any program")
-    return best
+class ProgramMatcher:
+    """Index of programs, to find the best matching program for many titles
+
+    Gives the same results as `find_best_matching_program`, but the program titles are
+    normalized only once, and the similarity score (`SequenceMatcher.ratio()`) is only computed
+    for candidates which can still beat the best match so far. Candidates are pruned using cheap
+    upper bounds of the score: first the title lengths (`real_quick_ratio()`, using an index
+    sorted by length), then the character counts (`quick_ratio()`).
+
+    Not thread-safe.
+    """
+
+    def __init__(
+        self,
+        programs: list[dict[str, Any]],
+        remove_diacritics: bool = False,
+        min_ratio: float = 0.8,
+    ):
+        self._programs = list(programs)
+        self._remove_diacritics = remove_diacritics
+        self._min_ratio = min_ratio
+        self._titles = [self._normalize(program["title"]) for program in self._programs]
+        # program indices sorted by title length, to find those of similar length by bisection
+        self._by_length = sorted(range(len(self._titles)), key=lambda i: len(self._titles[i]))
+        self._lengths = [len(self._titles[i]) for i in self._by_length]
+        # created on first use, they cache the analysis of the program title
+        self._matchers: dict[int, SequenceMatcher] = {}
+
+    def _normalize(self, title: str) -> str:
+        if self._remove_diacritics:
+            title = unidecode(title)
+        return title.lower()
+
+    def _matcher(self, index: int) -> SequenceMatcher:
+        if index not in self._matchers:
+            self._matchers[index] = SequenceMatcher(None, "", self._titles[index])
+        return self._matchers[index]
+
+    def find(self, title: str) -> dict[str, Any]:
+        """Returns the best matching program, raises `ValueError` if none scores high enough"""
+        return self.match(title)[0]
+
+    def match(self, title: str) -> tuple[dict[str, Any], float]:
+        """Like `find()`, but also returns the similarity score"""
+        a = self._normalize(title)
+        la = len(a)
+        r = self._min_ratio
+
+        # ratio <= 2 * min(la, lb) / (la + lb), which gives a range of useful lengths (widened
+        # by one on both sides against rounding, the exact bound is checked below)
+        low = bisect.bisect_left(self._lengths, math.floor(la * r / (2 - r)) - 1)
+        high = bisect.bisect_right(self._lengths, math.ceil(la * (2 - r) / r) + 1)
+        candidates = []
+        for index in self._by_length[low:high]:
+            lb = len(self._titles[index])
+            if la + lb and 2.0 * min(la, lb) / (la + lb) < r:
+                continue
+            matcher = self._matcher(index)
+            matcher.set_seq1(a)
+            bound = matcher.quick_ratio()
+            if bound >= r:
+                candidates.append((-bound, index))
+
+        # like max(), the first program wins on equal scores
+        best_ratio, best_index = r, None
+        for negative_bound, index in sorted(candidates):
+            if -negative_bound < best_ratio:
+                break
+            matcher = self._matcher(index)
+            matcher.set_seq1(a)
+            ratio = matcher.ratio()
+            if (
+                ratio > best_ratio
+                or ratio == best_ratio
+                and (best_index is None or index < best_index)
+            ):
+                best_ratio, best_index = ratio, index
+
+        if best_index is None:
+            raise ValueError(f"could not match '{title}' to any program")
+        return self._programs[best_index], best_ratio
+
+    def find_all(self, titles: Iterable[str]) -> list[dict[str, Any] | None]:
+        """Like `find()` for every title, with `None` for titles without a match"""
+        return [match[0] if match is not None else None for match in self.match_all(titles)]
+
+    def match_all(self, titles: Iterable[str]) -> list[tuple[dict[str, Any], float] | None]:
+        """Like `match()` for every title, with `None` for titles without a match"""
+        titles = list(titles)
+        results: dict[str, tuple[dict[str, Any], float] | None] = {}
+        for title in titles:
+            if title not in results:
+                try:
+                    results[title] = self.match(title)
+                except ValueError:
+                    results[title] = None
+        return [results[title] for title in titles]
+
+
+@dataclass
+class CachedResponse:
+    """Data of a response, with what's needed to revalidate it"""
+
+    data: Any
+    fetched_at: float
+    etag: str | None = None
+    last_modified: str | None = None
+    # increases whenever the data changes, to detect changes without comparing the data
+    version: int = 0
 
 
 class Api:
-    """API client for the Zomerparkfeest festival website API"""
+    """API client for the Zomerparkfeest festival website API
+
+    Responses are cached, and revalidated using their `ETag`/`Last-Modified` headers. Within
+    `max_age` seconds after fetching, the cached data is used without asking the website at all.
+    With a `cache_dir`, the cache is persisted, so it survives restarts, per base URL.
+
+    Thread-safe, requests are made one at a time.
+    """
 
-    def __init__(self, base_url: str):
-        self._session = requests.Session()
+    def __init__(
+        self,
+        base_url: str,
+        cache_dir: str | None = None,
+        max_age: float = 0,
+        session: requests.Session | None = None,
+    ):
+        self._session = session if session is not None else requests.Session()
         self.base_url = base_url
-        self._locations_cache: list[dict[str, Any]] | None = None
+        self._cache_dir = cache_dir
+        self._max_age = max_age
+        self._responses: dict[str, CachedResponse] = {}
+        # programs per location ID, with the version of the programs they were filtered from
+        self._programs_by_location: dict[int, tuple[int, list[dict[str, Any]]]] = {}
+        # version of the programs which were last returned, per location name
+        self._returned_versions: dict[str | None, int] = {}
         self._logger = logging.getLogger(__class__.__name__)
+        # guards the above and the cache files, reentrant as the public methods use each other
+        self._lock = threading.RLock()
+
+    def get_programs(
+        self, location_name: str | None = None, only_if_changed: bool = False
+    ) -> list[dict[str, Any]] | None:
+        """Get programs, optionally filtered by stage name.
+
+        With `only_if_changed`, returns `None` if the programs didn't change since they were last
+        returned for this stage.
+        """
+        with self._lock:
+            response = self._get("programs")
+            if not isinstance(response.data, list):
+                raise TypeError("Expected a list of programs from the API")
+            if only_if_changed and self._returned_versions.get(location_name) == response.version:
+                self._logger.info("Programs not changed")
+                return None
 
-    def get_programs(self, location_name: str | None = None) -> list[dict[str, Any]]:
-        """Get programs, optionally filtered by stage name."""
-        self._logger.info("Fetching programs")
-        response = self._session.get(f"{self.base_url}/programs")
-        response.raise_for_status()
-        programs = response.json()
-        if not isinstance(programs, list):
-            raise TypeError("Expected a list of programs from the API")
-
-        if location_name is not None:
-            location_id = self.get_location_id(location_name)
-            filtered_programs = []
-            for program in programs:
-                if "location" not in program:
-                    continue
-                if program["location"] is None or "id" not in program["location"]:
-                    continue
-                if program["location"]["id"] == location_id:
-                    filtered_programs.append(program)
-            return filtered_programs
-        return programs
+            if location_name is None:
+                programs = response.data
+            else:
+                location_id = self.get_location_id(location_name)
+                version, programs = self._programs_by_location.get(location_id, (None, []))
+                if version != response.version:
+                    programs = [
+                        program
+                        for program in response.data
+                        if isinstance(program.get("location"), dict)
+                        and program["location"].get("id") == location_id
+                    ]
+                    self._programs_by_location[location_id] = (response.version, programs)
+            self._returned_versions[location_name] = response.version
+            return list(programs)
 
     def get_locations(self, force=False) -> list[dict[str, Any]]:
         """Get locations (stages)
@@ -65,14 +206,13 @@ class Api:
         This method is cached, we can safely assume the stages do not change during one festival
         edition. If you want to force a refresh, set `force=True`.
         """
-        if self._locations_cache is None or force:
-            self._logger.info("Fetching locations")
-            response = self._session.get(f"{self.base_url}/locations")
-            response.raise_for_status()
-            self._locations_cache = response.json()
-            if not isinstance(self._locations_cache, list):
+        with self._lock:
+            if force or "locations" not in self._responses:
+                self._get("locations", revalidate=force)
+            locations = self._responses["locations"].data
+            if not isinstance(locations, list):
                 raise TypeError("Expected a list of locations from the API")
-        return self._locations_cache
+            return locations
 
     def get_location_id(self, location_name: str) -> int:
         for force in [False, True]:
@@ -81,3 +221,72 @@ class Api:
                     return location["id"]
             self._logger.error("Location not found, retrying without cache...")
         raise ValueError(f"Location '{location_name}' not found in the API")
+
+    def _get(self, endpoint: str, revalidate: bool = False) -> CachedResponse:
+        """Returns the (cached) response of `endpoint`
+
+        The cached response is used if it's younger than `max_age`, unless `revalidate` is set.
+        """
+        with self._lock:
+            cached = self._responses.get(endpoint) or self._load(endpoint)
+            if (
+                cached is not None
+                and not revalidate
+                and time.time() - cached.fetched_at < self._max_age
+            ):
+                return cached
+
+            headers = {}
+            if cached is not None and cached.etag is not None:
+                headers["If-None-Match"] = cached.etag
+            if cached is not None and cached.last_modified is not None:
+                headers["If-Modified-Since"] = cached.last_modified
+            self._logger.info(f"Fetching {endpoint}")
+            response = self._session.get(f"{self.base_url}/{endpoint}", headers=headers)
+            if cached is not None and response.status_code == 304:
+                self._logger.info(f"{endpoint} not modified")
+                cached.fetched_at = time.time()
+            else:
+                response.raise_for_status()
+                data = response.json()
+                version = 0 if cached is None else cached.version + (data != cached.data)
+                cached = CachedResponse(
+                    data,
+                    time.time(),
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    version,
+                )
+            self._responses[endpoint] = cached
+            self._save(endpoint)
+            return cached
+
+    def _cache_file(self, endpoint: str) -> str | None:
+        if self._cache_dir is None:
+            return None
+        # several APIs (e.g. the real one and a test one) can share the directory
+        url_hash = hashlib.sha256(self.base_url.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self._cache_dir, f"zpfwebsite_{endpoint}_{url_hash}.json")
+
+    def _load(self, endpoint: str) -> CachedResponse | None:
+        file = self._cache_file(endpoint)
+        if file is None:
+            return None
+        try:
+            with open(file) as f:
+                cached = CachedResponse(**json.load(f))
+        except FileNotFoundError:
+            return None
+        except (ValueError, TypeError) as e:
+            self._logger.error(f"Ignoring invalid cache file {file}: {e}")
+            return None
+        self._responses[endpoint] = cached
+        return cached
+
+    def _save(self, endpoint: str):
+        file = self._cache_file(endpoint)
+        if file is None:
+            return
+        with open(f"{file}.tmp", "w") as f:
+            json.dump(asdict(self._responses[endpoint]), f)
+        os.replace(f"{file}.tmp", file)
@@ -1,7 +1,11 @@
+import random
+import threading
+from difflib import SequenceMatcher
+
 import pytest
 import responses
-from ..api import Api, find_best_matching_program
-
+from unidecode import unidecode
+from ..api import Api, ProgramMatcher, find_best_matching_program
 
 BASE_URL = "https://www.foo.fake"
 
@@ -55,6 +59,83 @@ def test_invalid_location(api):
         api.get_programs("Nonexistent")
 
 
+def test_get_programs_conditional(programs, locations):
+    with responses.RequestsMock() as rsps:
+        rsps.get(f"{BASE_URL}/programs", json=programs, headers={"ETag": '"1"'})
+        rsps.get(f"{BASE_URL}/locations", json=locations)
+        rsps.get(f"{BASE_URL}/programs", status=304)
+        api = Api(BASE_URL)
+        assert api.get_programs("Amigo", only_if_changed=True) == [programs[0]]
+        assert api.get_programs("Amigo", only_if_changed=True) is None
+        assert rsps.calls[2].request.headers["If-None-Match"] == '"1"'
+        # the filtered view is cached too
+        assert api.get_programs("Zelt", only_if_changed=True) == [programs[1]]
+        assert len(rsps.calls) == 4
+
+
+def test_get_programs_changed_content(programs, locations):
+    with responses.RequestsMock() as rsps:
+        rsps.get(f"{BASE_URL}/programs", json=programs)
+        rsps.get(f"{BASE_URL}/programs", json=programs)
+        rsps.get(f"{BASE_URL}/programs", json=programs[1:])
+        api = Api(BASE_URL)
+        assert api.get_programs(only_if_changed=True) == programs
+        assert api.get_programs(only_if_changed=True) is None
+        assert api.get_programs(only_if_changed=True) == programs[1:]
+
+
+def test_persisted_cache(tmp_path, programs, locations):
+    with responses.RequestsMock() as rsps:
+        rsps.get(
+            f"{BASE_URL}/programs",
+            json=programs,
+            headers={"Last-Modified": "Sat, 09 Aug 2025 12:00:00 GMT"},
+        )
+        rsps.get(f"{BASE_URL}/locations", json=locations)
+        assert Api(BASE_URL, cache_dir=tmp_path, max_age=60).get_programs("Zelt") == [programs[1]]
+
+    with responses.RequestsMock() as rsps:
+        # within max_age, nothing is requested
+        api = Api(BASE_URL, cache_dir=tmp_path, max_age=60)
+        assert api.get_programs("Zelt", only_if_changed=True) == [programs[1]]
+
+    with responses.RequestsMock() as rsps:
+        rsps.get(f"{BASE_URL}/programs", status=304)
+        api = Api(BASE_URL, cache_dir=tmp_path)
+        assert api.get_programs() == programs
+        assert rsps.calls[0].request.headers["If-Modified-Since"] == "Sat, 09 Aug 2025 12:00:00 GMT"
+
+
+def test_persisted_cache_per_base_url(tmp_path, programs):
+    with responses.RequestsMock() as rsps:
+        rsps.get(f"{BASE_URL}/programs", json=programs)
+        rsps.get("https://other.fake/programs", json=programs[:1])
+        assert Api(BASE_URL, cache_dir=tmp_path, max_age=60).get_programs() == programs
+        other = Api("https://other.fake", cache_dir=tmp_path, max_age=60)
+        assert other.get_programs() == programs[:1]
+        assert Api(BASE_URL, cache_dir=tmp_path, max_age=60).get_programs() == programs
+
+
+def test_concurrent_use(tmp_path, mock_responses, programs):
+    api = Api(BASE_URL, cache_dir=tmp_path)
+    errors = []
+
+    def use():
+        try:
+            for _ in range(20):
+                assert api.get_programs("Amigo") == programs[:1]
+                api.get_programs(only_if_changed=True)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=use) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
 def test_find_best_matching_program():
     programs = [
         {"title": "awesome band", "description": "a"},
@@ -78,3 +159,46 @@ def test_find_best_matching_program_diacritics():
     with pytest.raises(ValueError):
         find_best_matching_program(programs, "Zoe")
     assert find_best_matching_program(programs, "Zoe", remove_diacritics=True) is programs[0]
+
+
+def reference_find_best_matching_program(programs, title, remove_diacritics=False):
+    """The original, exhaustive implementation (also compared with in `bench_matching`)"""
+
+    def ratio(program):
+        a, b = title, program["title"]
+        if remove_diacritics:
+            a, b = unidecode(a), unidecode(b)
+        return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+
+    best = max(programs, key=ratio)
+    if ratio(best) < 0.8:
+        raise ValueError(f"could not match '{title}' to any program")
+    return best
+
+
+@pytest.mark.parametrize("remove_diacritics", [False, True])
+def test_program_matcher_same_as_exhaustive(remove_diacritics):
+    rng = random.Random(1)
+    alphabet = "abcdeéëfghijklmnoöpqrstuvwxyz  "
+
+    def mutate(title):
+        chars = list(title)
+        for _ in range(rng.randint(0, 3)):
+            chars.insert(rng.randint(0, len(chars)), rng.choice(alphabet))
+            del chars[rng.randrange(len(chars))]
+        return "".join(chars)
+
+    titles = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 30))) for _ in range(300)]
+    # duplicates and near-duplicates, so ties are covered
+    titles += titles[:20] + [mutate(title) for title in titles[:50]]
+    programs = [{"title": title.title(), "index": i} for i, title in enumerate(titles)]
+    searches = [mutate(title) for title in rng.sample(titles, 200)] + ["", "x", "zzzz"]
+
+    matcher = ProgramMatcher(programs, remove_diacritics)
+    found = matcher.find_all(searches)
+    for title, program in zip(searches, found):
+        try:
+            expected = reference_find_best_matching_program(programs, title, remove_diacritics)
+        except ValueError:
+            expected = None
+        assert program is expected, title